@@ -0,0 +1,95 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+from foodgram.db.router import primary
+
+
+class TokenCache:
+    """
+    Ограниченный по размеру LRU-кэш «токен -> (пользователь, токен)»
+    в памяти процесса с временем жизни записей. Если включён
+    TOKEN_CACHE_USE_DJANGO_CACHE, промах в памяти проверяется ещё
+    и в общем кэше Django.
+    Записи хранятся сериализованными, чтобы параллельные запросы
+    не делили один экземпляр пользователя.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def _shared_key(key):
+        return f'auth_token:{key}'
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, payload = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    return pickle.loads(payload)
+                del self._entries[key]
+        if settings.TOKEN_CACHE_USE_DJANGO_CACHE:
+            payload = cache.get(self._shared_key(key))
+            if payload is not None:
+                self._store(key, payload)
+                return pickle.loads(payload)
+        return None
+
+    def set(self, key, value):
+        payload = pickle.dumps(value)
+        self._store(key, payload)
+        if settings.TOKEN_CACHE_USE_DJANGO_CACHE:
+            cache.set(
+                self._shared_key(key), payload, settings.TOKEN_CACHE_TTL
+            )
+
+    def _store(self, key, payload):
+        with self._lock:
+            self._entries[key] = (
+                time.monotonic() + settings.TOKEN_CACHE_TTL, payload
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        if settings.TOKEN_CACHE_USE_DJANGO_CACHE:
+            cache.delete_many([self._shared_key(key) for key in keys])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication без запроса к базе на каждый вызов API:
+    пользователь по токену берётся из token_cache. Кэш сбрасывается
+    сигналами при выходе (удаление токена), смене пароля
+    и деактивации пользователя (сохранение пользователя).
+    """
+
+    def authenticate_credentials(self, key):
+        credentials = token_cache.get(key)
+        if credentials is None:
+            # Реплика может ещё не знать об удалении токена.
+            with primary():
+                credentials = super().authenticate_credentials(key)
+            token_cache.set(key, credentials)
+        return credentials
@@ -0,0 +1,88 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from api.versions import bump_versions_on_commit, get_version
+from foodgram.db.router import primary
+from recipes.models import FavoriteRecipeUser, ShoppingCartUser
+from users.models import Follow
+
+VERSION_NAME = 'recipes'
+# Фильтры, от которых зависит сам набор рецептов на странице:
+# такие страницы у каждого пользователя свои и не кэшируются.
+USER_FILTERS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def _user_version_name(user_id):
+    return f'recipes:user:{user_id}'
+
+
+def is_cacheable(request):
+    """Можно ли отдать страницу списка рецептов из общего кэша."""
+    return (
+        request.accepted_renderer.format == 'json'
+        and not any(name in request.query_params for name in USER_FILTERS)
+    )
+
+
+def get_page_cache_key(request):
+    """
+    Ключ общей страницы: версия рецептов (сбрасывается сигналами)
+    и полный адрес запроса - от него зависят фильтры, страница
+    и ссылки next/previous.
+    """
+    return 'recipes:page:{}:{}'.format(
+        get_version(VERSION_NAME),
+        hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    )
+
+
+def get_user_relations(user):
+    """
+    Множества id рецептов в избранном и в списке покупок пользователя
+    и id авторов, на которых он подписан.
+    """
+    cache_key = 'recipes:relations:{}:{}'.format(
+        user.pk, get_version(_user_version_name(user.pk))
+    )
+    relations = cache.get(cache_key)
+    if relations is None:
+        with primary():
+            relations = (
+                set(FavoriteRecipeUser.objects.filter(
+                    user=user
+                ).values_list('recipe_id', flat=True)),
+                set(ShoppingCartUser.objects.filter(
+                    user=user
+                ).values_list('recipe_id', flat=True)),
+                set(Follow.objects.filter(
+                    user=user
+                ).values_list('following_id', flat=True)),
+            )
+        cache.set(cache_key, relations, settings.RECIPE_FEED_CACHE_TIMEOUT)
+    return relations
+
+
+def overlay_user_flags(data, user):
+    """Проставить в общей странице флаги текущего пользователя."""
+    if user.is_anonymous:
+        return data
+    favorited, in_cart, followed = get_user_relations(user)
+    for recipe in data['results']:
+        recipe['is_favorited'] = recipe['id'] in favorited
+        recipe['is_in_shopping_cart'] = recipe['id'] in in_cart
+        recipe['author']['is_subscribed'] = recipe['author']['id'] in followed
+    return data
+
+
+def invalidate_recipes():
+    """Сбросить общие страницы."""
+    bump_versions_on_commit(VERSION_NAME)
+
+
+def invalidate_users(user_ids):
+    """Сбросить избранное, покупки и подписки указанных пользователей."""
+    bump_versions_on_commit(
+        *(_user_version_name(user_id) for user_id in user_ids)
+    )
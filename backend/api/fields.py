@@ -1,4 +1,14 @@
+import base64
+import binascii
+import uuid
+
 import webcolors
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import (TemporaryUploadedFile,
+                                            UploadedFile)
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
 from rest_framework import serializers
 
 
@@ -12,3 +22,125 @@ class Hex2NameColor(serializers.Field):
         except ValueError:
             raise serializers.ValidationError('Для этого цвета нет имени')
         return data
+
+
+class RecipeImagesField(serializers.Field):
+    """
+    Ссылки на изображение рецепта каждого размера из
+    settings.IMAGE_RENDITIONS. Пока копии не готовы, отдаётся оригинал.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if not recipe.image:
+            return None
+        renditions = recipe.image_renditions or {}
+        if renditions.get('source') != recipe.image.name:
+            renditions = {}
+        request = self.context.get('request')
+        urls = {}
+        for size_name in settings.IMAGE_RENDITIONS:
+            path = renditions.get(size_name)
+            url = default_storage.url(path) if path else recipe.image.url
+            urls[size_name] = (
+                request.build_absolute_uri(url) if request else url
+            )
+        return urls
+
+
+class RecipeImageField(Base64ImageField):
+    """
+    Изображение рецепта: строка base64 (JSON) или файл (multipart).
+    Для base64 размер файла оценивается по длине строки, а строка
+    декодируется частями сразу во временный файл на диске; формат
+    и размеры картинки проверяются по заголовку из первых байтов.
+    Загруженный файл проходит те же проверки.
+    """
+    # Кратно 4, чтобы каждая часть декодировалась независимо.
+    CHUNK_SIZE = 64 * 1024
+    # Сколько байтов можно прочитать в поисках заголовка картинки.
+    HEADER_LIMIT = 256 * 1024
+    FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif'}
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            self.check_size(data.size)
+            extension = self.check_header(data, data.size)
+            if extension is None:
+                raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+            return self.to_image(data, extension)
+        if data in self.EMPTY_VALUES or not isinstance(data, str):
+            return super().to_internal_value(data)
+        # Переносы строк допустимы (base64.encodebytes, MIME).
+        payload = ''.join(data.rpartition(';base64,')[2].split())
+        decoded_size = len(payload) * 3 // 4 - payload[-2:].count('=')
+        self.check_size(decoded_size)
+        upload = TemporaryUploadedFile(
+            'image', 'application/octet-stream', decoded_size, None
+        )
+        try:
+            extension = self.decode_to_file(payload, upload)
+        except Exception:
+            upload.close()
+            raise
+        upload.size = upload.file.tell()
+        return self.to_image(upload, extension)
+
+    def to_image(self, upload, extension):
+        upload.seek(0)
+        upload.name = f'{uuid.uuid4()}.{extension}'
+        # Проверка Pillow в ImageField откроет временный файл по пути.
+        return serializers.ImageField.to_internal_value(self, upload)
+
+    def check_size(self, size):
+        if size > settings.RECIPE_IMAGE_MAX_SIZE:
+            raise serializers.ValidationError(
+                'Размер изображения не должен превышать '
+                f'{settings.RECIPE_IMAGE_MAX_SIZE // (1024 * 1024)} МБ.'
+            )
+
+    def decode_to_file(self, payload, upload):
+        """Декодирует base64 частями в upload, возвращает расширение."""
+        extension = None
+        for start in range(0, len(payload), self.CHUNK_SIZE):
+            try:
+                upload.file.write(base64.b64decode(
+                    payload[start:start + self.CHUNK_SIZE], validate=True
+                ))
+            except (binascii.Error, ValueError):
+                raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+            if extension is None:
+                upload.file.flush()
+                extension = self.check_header(upload, upload.file.tell())
+        if extension is None:
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        return extension
+
+    def check_header(self, upload, available):
+        """
+        Формат и размеры картинки по первым available байтам.
+        None - заголовок ещё не целиком, нужно больше данных.
+        """
+        if hasattr(upload, 'temporary_file_path'):
+            source = upload.temporary_file_path()
+        else:
+            source = upload
+            upload.seek(0)
+        try:
+            with Image.open(source) as image:
+                image_format, (width, height) = image.format, image.size
+        except Exception:
+            if available >= self.HEADER_LIMIT:
+                raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+            return None
+        if image_format not in self.FORMATS:
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            raise serializers.ValidationError(
+                f'Изображение {width}×{height} слишком большое.'
+            )
+        return self.FORMATS[image_format]
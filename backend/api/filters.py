@@ -1,22 +1,65 @@
-from django_filters import AllValuesMultipleFilter, rest_framework as filters
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from api.versions import get_version
+from foodgram.db.router import primary
+from recipes.models import Ingredient, Recipe, Tag, TagRecipe
+from recipes.search import search_recipes
+from users.models import User
+
+
+def get_tag_ids_by_slug():
+    """Словарь slug -> id тегов, кэшируется до изменения тегов."""
+    cache_key = 'tags:ids_by_slug:{}'.format(get_version('tags'))
+    tag_ids = cache.get(cache_key)
+    if tag_ids is None:
+        with primary():
+            tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(cache_key, tag_ids, settings.CACHE_VERSION_TIMEOUT)
+    return tag_ids
+
+
+def tag_choices():
+    return [(slug, slug) for slug in get_tag_ids_by_slug()]
 
 
 class CustomRecipeFilterSet(filters.FilterSet):
     """Кастомные фильтры."""
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
         label='tags',
-        queryset=Tag.objects.all()
+        method='filter_tags'
     )
-    author = AllValuesMultipleFilter(field_name='author__id')
+    # Переданные id проверяются выборкой по первичному ключу пользователей,
+    # а не SELECT DISTINCT author_id по всем рецептам.
+    author = filters.ModelMultipleChoiceFilter(
+        field_name='author',
+        queryset=User.objects.only('id'),
+        distinct=False
+    )
+    search = filters.CharFilter(method='filter_search')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
 
+    def filter_tags(self, queryset, name, value):
+        """
+        Рецепты хотя бы с одним из тегов. Подзапрос EXISTS по id тегов
+        не размножает рецепты, как JOIN по нескольким совпавшим тегам.
+        """
+        tag_ids = get_tag_ids_by_slug()
+        return queryset.filter(Exists(TagRecipe.objects.filter(
+            recipe=OuterRef('pk'),
+            tag_id__in=[tag_ids[slug] for slug in value]
+        )))
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию и описанию с ранжированием."""
+        return search_recipes(queryset, value)
+
     def _bool_filter(self, key, value, queryset, user):
         """Фильтрация для логических ключей."""
         map_for_queryset: dict = {f'{key}__user': user}
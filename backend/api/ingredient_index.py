@@ -0,0 +1,87 @@
+import threading
+from bisect import bisect_left
+
+from django.db import transaction
+
+from api.versions import bump_versions, get_version
+from foodgram.db.router import primary
+from recipes.models import Ingredient
+
+VERSION_NAME = 'ingredients'
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для автодополнения.
+    Хранит отсортированный массив названий в нижнем регистре и ищет
+    префикс двоичным поиском, без обращения к базе.
+    Перестраивается лениво при первом запросе после изменения
+    ингредиентов; версия лежит в кэше, чтобы другие процессы
+    (при общем кэше) тоже узнали об изменениях.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def invalidate(self):
+        """
+        Сбросить индекс (вызывается из сигналов модели Ingredient)
+        после коммита транзакции: индекс, собранный параллельным
+        запросом до коммита, иначе получил бы уже новую версию.
+        """
+        transaction.on_commit(self._reset)
+
+    def _reset(self):
+        self._snapshot = None
+        bump_versions(VERSION_NAME)
+
+    def _build(self, version):
+        with primary():
+            rows = list(
+                Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit'
+                )
+            )
+        ingredients = sorted(rows, key=lambda row: (row[1].lower(), row[0]))
+        keys = tuple(name.lower() for _, name, _ in ingredients)
+        entries = tuple(
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for pk, name, measurement_unit in ingredients
+        )
+        return version, keys, entries
+
+    def _get_snapshot(self):
+        version = get_version(VERSION_NAME)
+        snapshot = self._snapshot
+        if snapshot is None or snapshot[0] != version:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot[0] != version:
+                    snapshot = self._snapshot = self._build(version)
+        return snapshot
+
+    def search(self, query, limit=None):
+        """
+        Ингредиенты, название которых начинается с query, а за ними -
+        содержащие query в середине названия. Не больше limit штук.
+        """
+        _, keys, entries = self._get_snapshot()
+        query = query.lower()
+        result = []
+        position = bisect_left(keys, query)
+        while (position < len(keys) and keys[position].startswith(query)
+               and (limit is None or len(result) < limit)):
+            result.append(entries[position])
+            position += 1
+        if limit is not None and len(result) >= limit:
+            return result
+        for key, entry in zip(keys, entries):
+            if query in key and not key.startswith(query):
+                result.append(entry)
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,94 @@
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.http import QueryDict
+from django_filters import AllValuesMultipleFilter
+from django_filters import rest_framework as filters
+
+from api.filters import CustomRecipeFilterSet
+from foodgram.bench import (BenchCommand, create_recipes, create_users,
+                            measure)
+from recipes.models import Recipe
+
+AUTHOR_PREFIX = 'bench_author_'
+
+
+class DistinctAuthorFilterSet(filters.FilterSet):
+    """Прежний фильтр: варианты - SELECT DISTINCT author_id по рецептам."""
+    author = AllValuesMultipleFilter(field_name='author__id')
+
+    class Meta:
+        model = Recipe
+        fields = ['author']
+
+
+class Command(BenchCommand):
+    description = (
+        'Сравнение фильтра рецептов по автору: прежний '
+        'AllValuesMultipleFilter (SELECT DISTINCT author_id) и проверка '
+        'id по первичному ключу пользователей.'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--recipes', type=int, default=1_000_000,
+            help='Сколько рецептов создать.'
+        )
+        parser.add_argument(
+            '--authors', type=int, default=20_000,
+            help='Между сколькими авторами их распределить.'
+        )
+
+    def create_data(self, recipes, authors, batch_size):
+        author_ids = create_users(AUTHOR_PREFIX, authors, batch_size)
+        create_recipes(author_ids, recipes, batch_size)
+        return author_ids
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            author_ids = self.create_data(
+                options['recipes'], options['authors'], options['batch_size']
+            )
+            data = QueryDict(mutable=True)
+            data.setlist('author', [str(pk) for pk in author_ids[:3]])
+
+            def validate(filterset_class):
+                filterset = filterset_class(
+                    data, queryset=Recipe.objects.all()
+                )
+                if not filterset.is_valid():
+                    raise CommandError(filterset.errors)
+                return filterset
+
+            def first_page(filterset_class):
+                return list(validate(filterset_class).qs.values_list(
+                    'id', flat=True
+                )[:6])
+
+            if (first_page(DistinctAuthorFilterSet)
+                    != first_page(CustomRecipeFilterSet)):
+                raise CommandError('Фильтры вернули разные рецепты.')
+            results = [
+                (
+                    label,
+                    measure(lambda: validate(filterset_class),
+                            options['repeat']),
+                    measure(lambda: first_page(filterset_class),
+                            options['repeat']),
+                )
+                for label, filterset_class in (
+                    ('SELECT DISTINCT', DistinctAuthorFilterSet),
+                    ('первичный ключ', CustomRecipeFilterSet),
+                )
+            ]
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f'Рецептов: {options["recipes"]}, авторов: {options["authors"]}, '
+            'медиана по {} повторам.'.format(options['repeat'])
+        )
+        for label, validation, page in results:
+            self.stdout.write(
+                f'{label:>16}: проверка {validation:.3f} мс, '
+                f'первая страница {page:.3f} мс'
+            )
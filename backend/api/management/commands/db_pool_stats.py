@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from foodgram.db.pool import collect_stats
+
+ACTIVITY_SQL = '''
+    SELECT coalesce(state, 'unknown'), count(*)
+    FROM pg_stat_activity
+    WHERE datname = current_database()
+    GROUP BY 1 ORDER BY 1
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Статистика пулов соединений процессов приложения (open, in_use, '
+        'idle, waits, timeouts) и соединений на сервере PostgreSQL '
+        'относительно max_connections.'
+    )
+
+    def handle(self, *args, **options):
+        # Процессы публикуют статистику в кэш Django: чтобы видеть все
+        # процессы gunicorn, кэш должен быть общим (CACHE_BACKEND).
+        processes = collect_stats()
+        if not processes:
+            self.stdout.write('Нет данных о пулах (пул выключен или кэш '
+                              'не общий для процессов).')
+        totals = {}
+        for process, data in sorted(processes.items()):
+            for alias, stats in data['pools'].items():
+                self.stdout.write(
+                    f'{process} [{alias}]: ' + ', '.join(
+                        f'{key}={value}' for key, value in stats.items()
+                    )
+                )
+                for key in ('open', 'in_use', 'idle', 'waits', 'timeouts'):
+                    totals[key] = totals.get(key, 0) + stats[key]
+        if totals:
+            self.stdout.write('Всего: ' + ', '.join(
+                f'{key}={value}' for key, value in totals.items()
+            ))
+        for alias in connections:
+            connection = connections[alias]
+            if connection.vendor != 'postgresql':
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('SHOW max_connections')
+                max_connections = cursor.fetchone()[0]
+                cursor.execute(ACTIVITY_SQL)
+                states = cursor.fetchall()
+            self.stdout.write(
+                f'Сервер [{alias}]: max_connections={max_connections}, '
+                + ', '.join(f'{state}={count}' for state, count in states)
+            )
@@ -0,0 +1,227 @@
+import csv
+import json
+import re
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from api.ingredient_index import ingredient_index
+from recipes.models import Ingredient, IngredientRecipe
+
+FIXTURE_MODEL = 'recipes.ingredient'
+WHITESPACE_AND_COMMAS = re.compile(r'[\s,]*')
+
+
+def iter_csv(file):
+    """Строки CSV вида «название,единица измерения»."""
+    for row in csv.reader(file):
+        if len(row) >= 2 and row[0].strip():
+            yield None, row[0].strip(), row[1].strip()
+
+
+def iter_json_array(file, chunk_size=64 * 1024):
+    """
+    Элементы JSON-массива по одному, без чтения всего файла в память.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, started, eof = '', 0, False, False
+    while True:
+        position = WHITESPACE_AND_COMMAS.match(buffer, position).end()
+        if position < len(buffer):
+            if not started:
+                if buffer[position] != '[':
+                    raise CommandError('Ожидался JSON-массив.')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise CommandError('Некорректный JSON.')
+            else:
+                yield item
+                continue
+        elif eof:
+            raise CommandError('Неожиданный конец JSON-файла.')
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer, position = buffer[position:] + chunk, 0
+
+
+def iter_json(file):
+    """
+    Ингредиенты из JSON: список {"name", "measurement_unit"}
+    или фикстура Django (берутся только объекты recipes.ingredient).
+    """
+    for item in iter_json_array(file):
+        pk = None
+        if 'model' in item:
+            if item['model'] != FIXTURE_MODEL:
+                continue
+            pk, item = item.get('pk'), item['fields']
+        yield pk, item['name'].strip(), item['measurement_unit'].strip()
+
+
+class Command(BaseCommand):
+    help = (
+        'Загрузка ингредиентов из CSV/JSON (в том числе из фикстуры) '
+        'пакетными вставками с удалением дублей '
+        'по паре (название, единица измерения).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='*',
+            # Каталог data/ не входит в образ backend, фикстура - входит.
+            default=[settings.BASE_DIR / 'fixtures.json'],
+            help='Файлы .csv или .json (по умолчанию backend/fixtures.json).'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пакета для bulk_create/bulk_update.'
+        )
+        parser.add_argument(
+            '--upsert',
+            action='store_true',
+            help=(
+                'Для записей с pk (фикстура) обновлять существующие '
+                'ингредиенты и создавать новые с тем же pk. Ингредиенты, '
+                'которые уже есть в рецептах, и обновления, дающие дубль, '
+                'пропускаются как конфликты.'
+            )
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать изменения, ничего не записывая.'
+        )
+
+    def read(self, path):
+        path = Path(path)
+        readers = {'.csv': iter_csv, '.json': iter_json}
+        if path.suffix.lower() not in readers:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        if not path.exists():
+            raise CommandError(f'Файл не найден: {path}')
+        with open(path, encoding='utf-8', newline='') as file:
+            yield from readers[path.suffix.lower()](file)
+
+    @staticmethod
+    def load_existing(upsert):
+        """
+        Пары (название, единица измерения) из базы; для --upsert ещё
+        пары по pk и pk ингредиентов, которые есть в рецептах.
+        """
+        existing_keys = set(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
+        if not upsert:
+            return existing_keys, {}, set()
+        existing_by_pk = {
+            pk: (name, measurement_unit)
+            for pk, name, measurement_unit
+            in Ingredient.objects.values_list(
+                'pk', 'name', 'measurement_unit'
+            )
+        }
+        used_pks = set(IngredientRecipe.objects.values_list(
+            'ingredient_id', flat=True
+        ).distinct())
+        return existing_keys, existing_by_pk, used_pks
+
+    def report_conflicts(self, conflicts):
+        for pk, old_key, key, reason in conflicts:
+            self.stderr.write(
+                f'Конфликт pk={pk}: {old_key} -> {key} ({reason}).'
+            )
+
+    def save(self, to_create, to_update, batch_size):
+        with transaction.atomic():
+            Ingredient.objects.bulk_create(to_create, batch_size=batch_size)
+            Ingredient.objects.bulk_update(
+                to_update,
+                ('name', 'measurement_unit'),
+                batch_size=batch_size
+            )
+            if any(ingredient.pk for ingredient in to_create):
+                # Как и loaddata: после вставки явных pk
+                # последовательность нужно сдвинуть.
+                with connection.cursor() as cursor:
+                    for sql in connection.ops.sequence_reset_sql(
+                            no_style(), [Ingredient]
+                    ):
+                        cursor.execute(sql)
+        # bulk-операции не отправляют сигналы post_save.
+        ingredient_index.invalidate()
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        batch_size = options['batch_size']
+        existing_keys, existing_by_pk, used_pks = self.load_existing(
+            options['upsert']
+        )
+        to_create, to_update, conflicts = [], [], []
+        rows = skipped = 0
+        for path in options['paths']:
+            for pk, name, measurement_unit in self.read(path):
+                rows += 1
+                key = (name, measurement_unit)
+                if options['upsert'] and pk in existing_by_pk:
+                    old_key = existing_by_pk[pk]
+                    if old_key == key:
+                        skipped += 1
+                    elif pk in used_pks:
+                        conflicts.append(
+                            (pk, old_key, key, 'используется в рецептах')
+                        )
+                    elif key in existing_keys:
+                        conflicts.append((pk, old_key, key, 'дубль'))
+                    else:
+                        to_update.append(Ingredient(
+                            pk=pk, name=name, measurement_unit=measurement_unit
+                        ))
+                        existing_by_pk[pk] = key
+                        existing_keys.discard(old_key)
+                        existing_keys.add(key)
+                    continue
+                if key in existing_keys:
+                    skipped += 1
+                    continue
+                existing_keys.add(key)
+                to_create.append(Ingredient(
+                    pk=pk if options['upsert'] else None,
+                    name=name,
+                    measurement_unit=measurement_unit,
+                ))
+
+        if not options['dry_run'] and (to_create or to_update):
+            self.save(to_create, to_update, batch_size)
+
+        if options['verbosity'] > 1:
+            self.report_conflicts(conflicts)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            '{prefix}Прочитано строк: {rows}, создано: {created}, '
+            'обновлено: {updated}, пропущено дублей: {skipped}, '
+            'конфликтов: {conflicts}. '
+            '{elapsed:.2f} с, {rate:.0f} строк/с.'.format(
+                prefix='[dry run] ' if options['dry_run'] else '',
+                rows=rows,
+                created=len(to_create),
+                updated=len(to_update),
+                skipped=skipped,
+                conflicts=len(conflicts),
+                elapsed=elapsed,
+                rate=rows / elapsed if elapsed else rows,
+            )
+        ))
@@ -0,0 +1,63 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import quote_etag
+from django.utils.http import parse_etags
+
+from api.versions import get_version
+from foodgram.db.router import primary
+
+
+class VersionedCacheMixin:
+    """
+    Кэширование справочников (теги, ингредиенты) для list и retrieve.
+    Версия справочника меняется сигналами при изменении модели
+    и служит сильным ETag: на запрос с совпадающим If-None-Match
+    отдаётся 304 без обращения к базе. Полный ответ отдаётся из кэша
+    уже отрендеренных байтов.
+    """
+    version_name = None
+
+    def list(self, request, *args, **kwargs):
+        return self.versioned_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.versioned_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def versioned_response(self, handler, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        # Браузерный API (format=api) не кэшируется.
+        if renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        etag = quote_etag(
+            f'{self.version_name}-{get_version(self.version_name)}'
+        )
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+        cache_key = 'response:{}:{}'.format(
+            etag,
+            hashlib.md5(request.get_full_path().encode()).hexdigest()
+        )
+        content = cache.get(cache_key)
+        if content is None:
+            with primary():
+                response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            content = renderer.render(
+                response.data,
+                request.accepted_media_type,
+                self.get_renderer_context()
+            )
+            cache.set(cache_key, content, settings.CACHE_VERSION_TIMEOUT)
+        response = HttpResponse(content, content_type=renderer.media_type)
+        response['ETag'] = etag
+        return response
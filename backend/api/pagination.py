@@ -1,6 +1,125 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная (keyset) пагинация от новых записей к старым.
+    Порядок задаётся уникальным набором полей, например
+    ('pub_date', 'id'); следующая страница выбирается условием
+    «строго меньше последней записи» вместо OFFSET и без COUNT(*).
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = 6
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def __init__(self, ordering):
+        self.ordering = ordering
+
+    def get_page_size(self, request):
+        value = request.query_params.get(self.page_size_query_param, '')
+        if value.isdigit() and int(value) > 0:
+            return int(value)
+        return self.page_size
+
+    def encode_cursor(self, obj):
+        values = [str(getattr(obj, field)) for field in self.ordering]
+        return base64.urlsafe_b64encode(
+            json.dumps(values).encode()
+        ).decode()
+
+    def decode_cursor(self, raw, model):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(raw.encode()))
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_keyset_filter(self, values):
+        """
+        (f1, f2, ...) < (v1, v2, ...) в лексикографическом порядке.
+        Условие f1 <= v1 позволяет использовать индекс по диапазону.
+        """
+        condition = Q()
+        for position, field in enumerate(self.ordering):
+            condition |= Q(
+                **dict(zip(self.ordering[:position], values[:position])),
+                **{f'{field}__lt': values[position]}
+            )
+        return Q(**{f'{self.ordering[0]}__lte': values[0]}) & condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(
+            *(f'-{field}' for field in self.ordering)
+        )
+        raw_cursor = request.query_params.get(self.cursor_query_param)
+        if raw_cursor:
+            queryset = queryset.filter(self.get_keyset_filter(
+                self.decode_cursor(raw_cursor, queryset.model)
+            ))
+        page = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_cursor = self.encode_cursor(page[-1])
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.next_cursor
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        ]))
 
 
 class CustomPagination(PageNumberPagination):
+    """
+    Постраничная пагинация (page/limit). Если во вьюсете задан
+    keyset_ordering, то запрос с параметром cursor (для первой страницы -
+    пустым, ?cursor=) обслуживается курсорной пагинацией.
+    Явно упорядоченный queryset (например, поиск по релевантности)
+    всегда отдаётся постранично: курсор пересортировал бы его
+    по keyset_ordering.
+    """
     page_size_query_param = "limit"
     page_size = 6
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, 'keyset_ordering', None)
+        if (ordering
+                and not queryset.query.order_by
+                and KeysetPagination.cursor_query_param
+                in request.query_params):
+            self.keyset = KeysetPagination(ordering)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,38 @@
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import JSONParser, MultiPartParser
+
+
+class RequestTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большой запрос.'
+    default_code = 'request_too_large'
+
+
+class ContentLengthLimitMixin:
+    """
+    Отклоняет запрос по заголовку Content-Length до чтения тела,
+    если тело больше settings.RECIPE_REQUEST_MAX_SIZE.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if length > settings.RECIPE_REQUEST_MAX_SIZE:
+            raise RequestTooLarge
+        return super().parse(stream, media_type, parser_context)
+
+
+class LimitedJSONParser(ContentLengthLimitMixin, JSONParser):
+    """Основной способ: изображение передаётся строкой base64."""
+
+
+class LimitedMultiPartParser(ContentLengthLimitMixin, MultiPartParser):
+    """
+    Изображение передаётся файлом без base64; Django пишет большие
+    файлы во временный файл на диске, не держа их в памяти.
+    """
@@ -1,11 +1,12 @@
-from django.contrib.auth.models import AnonymousUser
+from django.conf import settings
 from django.contrib.auth.password_validation import validate_password
-from drf_extra_fields.fields import Base64ImageField
+from django.db import transaction
 from rest_framework import serializers
 
-from api.fields import Hex2NameColor
+from api import shopping_cart
+from api.fields import Hex2NameColor, RecipeImageField, RecipeImagesField
 from recipes.models import (FavoriteRecipeUser, Ingredient, IngredientRecipe,
-                            Recipe, ShoppingCartUser, Tag)
+                            Recipe, ShoppingCartUser, Tag, TagRecipe)
 from users.models import Follow, User
 
 
@@ -28,12 +29,7 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = 'is_subscribed',
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return Follow.objects.filter(
-            user=user, following=obj
-        ).exists()
+        return user_is_subscribed(self, obj)
 
 
 class NewUserSerializer(serializers.ModelSerializer):
@@ -73,6 +69,15 @@ class SetPasswordSerializer(serializers.Serializer):
         return value
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетных операций."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_LIMIT
+    )
+
+
 class TagSerializer(serializers.ModelSerializer):
     color = Hex2NameColor()
 
@@ -124,7 +129,8 @@ class IngredientAmountSerializer(serializers.ModelSerializer):
 class RecipeSerializer(serializers.ModelSerializer):
     """Сериалайзер рецепта"""
     author = UserSerializer(read_only=True)
-    image = Base64ImageField()
+    image = RecipeImageField()
+    images = RecipeImagesField()
     ingredients = IngredientRecipeSerializer(
         read_only=True,
         many=True,
@@ -139,27 +145,34 @@ class RecipeSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'tags', 'author', 'ingredients',
             'is_favorited', 'is_in_shopping_cart', 'name',
-            'image', 'text', 'cooking_time',
+            'image', 'images', 'text', 'cooking_time',
         )
 
+    def _user_relation_flag(self, obj, flag, model):
+        """Флаг связи рецепта с текущим пользователем.
+
+        Для списков флаг уже посчитан в запросе (см.
+        RecipeViewSet.get_queryset), поэтому отдельный запрос делается
+        только для рецептов, полученных в обход вьюсета.
+        """
+        user = self.context['request'].user
+        if user.is_anonymous or self.context.get('shared_page'):
+            return False
+        if hasattr(obj, flag):
+            return getattr(obj, flag)
+        return model.objects.filter(user=user, recipe=obj).exists()
+
     def get_is_favorited(self, obj):
         """Проверка, находится ли в избранном."""
-        user = self.context['request'].user
-        # Если пользователь не аноним и подписка существует
-        if (user != AnonymousUser()
-                and FavoriteRecipeUser.objects.filter(
-                    user=user, recipe=obj.pk
-                ).exists()):
-            return True
-        return False
+        return self._user_relation_flag(
+            obj, 'is_favorited', FavoriteRecipeUser
+        )
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user.id
-        recipe = obj.id
-        return ShoppingCartUser.objects.filter(
-            user_id=user,
-            recipe_id=recipe
-        ).exists()
+        """Проверка, находится ли в списке покупок."""
+        return self._user_relation_flag(
+            obj, 'is_in_shopping_cart', ShoppingCartUser
+        )
 
 
 class RecipePostSerializer(serializers.ModelSerializer):
@@ -169,7 +182,7 @@ class RecipePostSerializer(serializers.ModelSerializer):
         queryset=Tag.objects.all(), many=True
     )
     ingredients = IngredientAmountSerializer(many=True)
-    image = Base64ImageField()
+    image = RecipeImageField()
 
     class Meta:
         model = Recipe
@@ -208,39 +221,85 @@ class RecipePostSerializer(serializers.ModelSerializer):
             )
         return tags
 
-    def add_ingredients_and_tags(self, tags, ingredients, recipe):
-        for tag in tags:
-            recipe.tags.add(tag)
-            recipe.save()
-        bulk_list = list()
-        for ingredient in ingredients:
-            bulk_list.append(
-                IngredientRecipe(
-                    ingredient_id=ingredient.get('id'),
-                    amount=ingredient.get('amount'),
-                    recipe=recipe
-                )
+    def set_ingredients(self, recipe, ingredients, existing=()):
+        """
+        Привести ингредиенты рецепта к переданному списку, меняя только
+        отличающиеся строки: удаление лишних, массовая вставка новых
+        и массовое обновление изменившихся количеств.
+        """
+        existing = {item.ingredient_id: item for item in existing}
+        amounts = {item['id']: item['amount'] for item in ingredients}
+        removed = existing.keys() - amounts.keys()
+        if removed:
+            IngredientRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        added = amounts.keys() - existing.keys()
+        IngredientRecipe.objects.bulk_create([
+            IngredientRecipe(
+                recipe=recipe, ingredient_id=ingredient_id,
+                amount=amounts[ingredient_id]
             )
-        IngredientRecipe.objects.bulk_create(bulk_list)
-        return recipe
-
+            for ingredient_id in added
+        ])
+        changed = []
+        for ingredient_id, item in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        IngredientRecipe.objects.bulk_update(changed, ('amount',))
+        if existing and (added or changed):
+            # bulk_create и bulk_update не отправляют сигналы.
+            shopping_cart.invalidate_for_recipes([recipe.pk])
+
+    def set_tags(self, recipe, tags, existing=()):
+        """Привести теги рецепта к переданному списку."""
+        existing = {tag.pk for tag in existing}
+        tag_ids = {tag.pk for tag in tags}
+        if existing - tag_ids:
+            TagRecipe.objects.filter(
+                recipe=recipe, tag_id__in=existing - tag_ids
+            ).delete()
+        TagRecipe.objects.bulk_create([
+            TagRecipe(recipe=recipe, tag_id=tag_id)
+            for tag_id in tag_ids - existing
+        ])
+
+    def save(self, **kwargs):
+        """
+        Временный файл изображения закрывается после сохранения: хранилище
+        уже переместило его, и иначе при сборке мусора удаление
+        несуществующего файла выводит ошибку.
+        """
+        image = self.validated_data.get('image')
+        try:
+            return super().save(**kwargs)
+        finally:
+            if image is not None:
+                image.close()
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
-        return self.add_ingredients_and_tags(
-            tags, ingredients, recipe
-        )
+        self.set_ingredients(recipe, ingredients)
+        self.set_tags(recipe, tags)
+        return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.ingredients.clear()
-        instance.tags.clear()
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
         instance = super().update(instance, validated_data)
-        return self.add_ingredients_and_tags(
-            tags, ingredients, instance
-        )
+        if ingredients is not None:
+            self.set_ingredients(
+                instance, ingredients, instance.ingredient_in_recipe.all()
+            )
+        if tags is not None:
+            self.set_tags(instance, tags, instance.tags.all())
+        return instance
 
     def to_representation(self, instance):
         return RecipeSerializer(instance, context=self.context).data
@@ -248,10 +307,11 @@ class RecipePostSerializer(serializers.ModelSerializer):
 
 class SubscribeRecipeSerializer(serializers.ModelSerializer):
     """Сериалайзер для подписки на пользователя"""
+    images = RecipeImagesField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time',)
+        fields = ('id', 'name', 'image', 'images', 'cooking_time',)
 
 
 class SubscriptionsSerializer(serializers.ModelSerializer):
@@ -259,7 +319,6 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
 
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -273,42 +332,52 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
             'recipes',
             'recipes_count',
         )
+        read_only_fields = ('recipes_count',)
 
     def get_is_subscribed(self, obj):
         """Подписан ли текущий пользователь на другого пользователя."""
         return user_is_subscribed(self, obj)
 
-    def get_recipes_count(self, obj):
-        """Общее количество рецептов пользователя."""
-        return Recipe.objects.filter(author=obj).count()
-
     def get_recipes(self, obj):
-        """Получить рецепты пользователя."""
-        recipes_limit = self.context['request'].GET.get('recipes_limit')
-        interes_user = obj
-        if recipes_limit:
-            return SubRecipeSerializer(
-                Recipe.objects.filter(
-                    author=interes_user
-                )[:int(recipes_limit)],
-                many=True
-            ).data
-        return SubRecipeSerializer(
-            Recipe.objects.filter(author=interes_user),
-            many=True
-        ).data
+        """
+        Получить рецепты пользователя.
+        Превью рецептов для всей страницы вьюсет кладёт в контекст
+        (ключ recipes_preview), чтобы не делать запрос на каждого автора.
+        """
+        preview = self.context.get('recipes_preview')
+        if preview is not None:
+            recipes = preview.get(obj.pk, [])
+        else:
+            recipes = Recipe.objects.filter(author=obj)
+        return SubRecipeSerializer(recipes, many=True).data
+
+
+def get_followed_ids(context):
+    """
+    Множество id авторов, на которых подписан текущий пользователь.
+    Загружается одним запросом и хранится в контексте корневого
+    сериалайзера, поэтому общее для всех вложенных авторов страницы.
+    """
+    if 'followed_ids' not in context:
+        context['followed_ids'] = set(
+            Follow.objects.filter(
+                user=context['request'].user
+            ).values_list('following_id', flat=True)
+        )
+    return context['followed_ids']
 
 
 def user_is_subscribed(self, obj):
     """Подписан ли текущий пользователь на другого пользователя."""
     user = self.context['request'].user
-    if user.is_anonymous:
+    if user.is_anonymous or self.context.get('shared_page'):
         return False
-    return Follow.objects.filter(user=user, following=obj.pk).exists()
+    return obj.pk in get_followed_ids(self.context)
 
 
 class SubRecipeSerializer(serializers.ModelSerializer):
     """Сериалайзер для вывода полей рецепта в подписках."""
+    images = RecipeImagesField()
 
     class Meta:
         model = Recipe
@@ -316,5 +385,6 @@ class SubRecipeSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'images',
             'cooking_time',
         )
@@ -0,0 +1,178 @@
+import csv
+import hashlib
+import io
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+from api.versions import bump_versions_on_commit, get_version
+from recipes.models import IngredientRecipe, ShoppingCartUser
+
+TITLE = (
+    'Ваш сервис, Продуктовый помощник, подготовил \nсписок '
+    'покупок по выбранным рецептам:\n'
+)
+EMPTY_MESSAGE = (
+    'К сожалению, в списке ваших покупок пусто - '
+    'поскольку Вы не добавили в него ни одного рецепта.'
+)
+CSV_HEADER = ('Ингредиент', 'Единица измерения', 'Количество')
+PDF_FONT_NAME = 'ShoppingCartFont'
+
+
+def get_ingredients(user):
+    """
+    Суммарное количество каждого ингредиента из рецептов в списке
+    покупок пользователя: кортежи (название, единица, количество).
+    """
+    return IngredientRecipe.objects.filter(
+        recipe__recipe_in_shoplist__user=user
+    ).values_list(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).annotate(
+        total_amount=Sum('amount')
+    ).order_by('ingredient__name', 'ingredient__measurement_unit')
+
+
+def render_txt(ingredients):
+    """Список покупок в текстовом виде."""
+    yield TITLE + 50 * '_' + '\n\n'
+    is_empty = True
+    for name, measurement_unit, amount in ingredients:
+        is_empty = False
+        yield f'\t•\t{name} ({measurement_unit}) — {amount}\n\n'
+    if is_empty:
+        yield EMPTY_MESSAGE
+
+
+class _Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(ingredients):
+    """Список покупок в CSV (с BOM, чтобы Excel распознал кодировку)."""
+    writer = csv.writer(_Echo())
+    yield '\ufeff' + writer.writerow(CSV_HEADER)
+    for row in ingredients:
+        yield writer.writerow(row)
+
+
+def render_json(ingredients):
+    """Список покупок в JSON-массиве."""
+    yield '['
+    separator = ''
+    for name, measurement_unit, amount in ingredients:
+        yield separator + json.dumps(
+            {
+                'name': name,
+                'measurement_unit': measurement_unit,
+                'amount': amount,
+            },
+            ensure_ascii=False
+        )
+        separator = ','
+    yield ']'
+
+
+def render_pdf(ingredients):
+    """
+    Список покупок в PDF. Шрифт с кириллицей (settings.SHOPPING_CART_PDF_FONT)
+    встраивается в документ.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    if PDF_FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT_NAME, settings.SHOPPING_CART_PDF_FONT)
+        )
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    margin, line_height = 50, 20
+    y = height - margin
+
+    def draw_line(text, size=12):
+        nonlocal y
+        if y < margin:
+            pdf.showPage()
+            y = height - margin
+        pdf.setFont(PDF_FONT_NAME, size)
+        pdf.drawString(margin, y, text)
+        y -= line_height
+
+    for line in TITLE.splitlines():
+        draw_line(line, size=14)
+    y -= line_height
+    is_empty = True
+    for name, measurement_unit, amount in ingredients:
+        is_empty = False
+        draw_line(f'•  {name} ({measurement_unit}) — {amount}')
+    if is_empty:
+        draw_line(EMPTY_MESSAGE, size=10)
+    pdf.save()
+    yield buffer.getvalue()
+
+
+EXPORT_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', render_txt),
+    'csv': ('text/csv; charset=utf-8', render_csv),
+    'json': ('application/json', render_json),
+    'pdf': ('application/pdf', render_pdf),
+}
+
+
+def _version_name(user_id):
+    return f'shopping_cart:{user_id}'
+
+
+def get_cache_key(user, export_format):
+    """
+    Ключ кэша готового файла. Складывается из версии списка покупок
+    пользователя (сбрасывается сигналами) и набора рецептов в нём.
+    """
+    version = get_version(_version_name(user.pk))
+    recipe_ids = ShoppingCartUser.objects.filter(
+        user=user
+    ).order_by('recipe_id').values_list('recipe_id', flat=True)
+    digest = hashlib.md5(
+        ','.join(map(str, recipe_ids)).encode()
+    ).hexdigest()
+    return f'shopping_cart:{user.pk}:{version}:{digest}:{export_format}'
+
+
+def invalidate(user_ids):
+    """Сбросить кэш списков покупок указанных пользователей."""
+    bump_versions_on_commit(
+        *(_version_name(user_id) for user_id in user_ids)
+    )
+
+
+def invalidate_for_recipes(recipe_ids):
+    """Сбросить кэш у всех, у кого рецепты лежат в списке покупок."""
+    invalidate(set(ShoppingCartUser.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('user_id', flat=True)))
+
+
+def cached_render(cache_key, chunks):
+    """
+    Отдаёт части файла по мере генерации и после последней
+    сохраняет весь файл в кэш.
+    """
+    parts = []
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        parts.append(chunk)
+        yield chunk
+    cache.set(
+        cache_key, b''.join(parts), settings.SHOPPING_CART_CACHE_TIMEOUT
+    )
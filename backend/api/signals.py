@@ -0,0 +1,96 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api import feed_cache, shopping_cart
+from api.authentication import token_cache
+from api.ingredient_index import ingredient_index
+from api.versions import bump_versions_on_commit
+from recipes.images import recipe_images_ready
+from recipes.models import (FavoriteRecipeUser, Ingredient, IngredientRecipe,
+                            Recipe, ShoppingCartUser, Tag, TagRecipe)
+from recipes.signals import relations_bulk_created, relations_bulk_deleted
+from users.models import Follow, User
+
+
+@receiver((post_save, post_delete), sender=ShoppingCartUser)
+def shopping_cart_changed(sender, instance, **kwargs):
+    """Рецепт добавлен в список покупок или удалён из него."""
+    shopping_cart.invalidate([instance.user_id])
+
+
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    """Изменился состав рецепта."""
+    shopping_cart.invalidate_for_recipes([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_ingredients_cleared(sender, instance, action, reverse, **kwargs):
+    """Состав рецепта изменён через менеджер Recipe.ingredients."""
+    if action in ('post_add', 'post_remove', 'post_clear') and not reverse:
+        shopping_cart.invalidate_for_recipes([instance.pk])
+        feed_cache.invalidate_recipes()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+@receiver((post_save, post_delete), sender=TagRecipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(recipe_images_ready)
+def recipes_changed(sender, **kwargs):
+    """Изменились рецепты, их состав, теги или копии изображений."""
+    feed_cache.invalidate_recipes()
+
+
+@receiver((post_save, post_delete), sender=FavoriteRecipeUser)
+@receiver((post_save, post_delete), sender=ShoppingCartUser)
+@receiver((post_save, post_delete), sender=Follow)
+def user_relation_changed(sender, instance, **kwargs):
+    """Изменились избранное, список покупок или подписки пользователя."""
+    feed_cache.invalidate_users([instance.user_id])
+
+
+@receiver((relations_bulk_created, relations_bulk_deleted))
+def user_relations_bulk_changed(sender, user_id, **kwargs):
+    """Пакетное изменение избранного или списка покупок."""
+    if sender is ShoppingCartUser:
+        shopping_cart.invalidate([user_id])
+    feed_cache.invalidate_users([user_id])
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    """Ингредиент создан, изменён или удалён."""
+    ingredient_index.invalidate()
+    feed_cache.invalidate_recipes()
+    # Название и единица измерения входят в готовые списки покупок.
+    shopping_cart.invalidate_for_recipes(
+        IngredientRecipe.objects.filter(
+            ingredient=instance
+        ).values('recipe_id')
+    )
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(sender, **kwargs):
+    """Тег создан, изменён или удалён."""
+    bump_versions_on_commit('tags')
+    feed_cache.invalidate_recipes()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Выход пользователя (djoser token/logout удаляет токен)."""
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    """Смена пароля, деактивация и любые другие изменения пользователя."""
+    token_cache.invalidate(*Token.objects.filter(
+        user_id=instance.pk
+    ).values_list('key', flat=True))
+    # Данные автора входят в страницы рецептов; вход (last_login) - нет.
+    if not created and set(update_fields or ()) != {'last_login'}:
+        feed_cache.invalidate_recipes()
@@ -0,0 +1,724 @@
+import base64
+import json
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from recipes.feed import rebuild_feeds
+from recipes.models import (FavoriteRecipeUser, FeedEntry, Ingredient,
+                            IngredientRecipe, Recipe, ShoppingCartUser, Tag,
+                            TagRecipe)
+from api.authentication import token_cache
+from api.utils import can_delete_returning, create_relation
+from users.models import Follow, User
+
+RECIPES_COUNT = 12
+PASSWORD = 'Pass!word123'
+
+
+def create_user(username, **fields):
+    """Пользователь с почтой <username>@foodgram.ru и паролем PASSWORD."""
+    fields.setdefault('first_name', username)
+    fields.setdefault('last_name', username)
+    return User.objects.create_user(
+        username=username, email=f'{username}@foodgram.ru',
+        password=PASSWORD, **fields
+    )
+
+
+def create_recipe(author, name='Рецепт', **fields):
+    """Рецепт без тегов и ингредиентов; файл изображения не создаётся."""
+    fields.setdefault('text', 'Описание')
+    fields.setdefault('cooking_time', 10)
+    image = fields.setdefault('image', 'recipes/test.png')
+    # Копии изображения уже «готовы»: фоновая обработка не запускается.
+    fields.setdefault('image_renditions', {'source': image})
+    return Recipe.objects.create(author=author, name=name, **fields)
+
+
+class FoodgramAPITestCase(APITestCase):
+    """
+    Кэш Django и кэш токенов живут дольше одного теста,
+    поэтому перед каждым тестом они очищаются.
+    """
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+
+
+class RecipeQueryCountTest(FoodgramAPITestCase):
+    """
+    Число запросов к базе при выдаче рецептов не зависит от размера
+    страницы: автор загружается через JOIN, теги и ингредиенты -
+    одним запросом на всю страницу.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.reader = create_user('reader')
+        tags = [
+            Tag.objects.create(name=f'Тег {i}', slug=f'tag{i}')
+            for i in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}')
+            for i in range(5)
+        ]
+        for i in range(RECIPES_COUNT):
+            recipe = create_recipe(cls.author, f'Рецепт {i}')
+            TagRecipe.objects.bulk_create(
+                TagRecipe(tag=tag, recipe=recipe)
+                for tag in (tags[i % 3], tags[(i + 1) % 3])
+            )
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(ingredient=ingredient, recipe=recipe,
+                                 amount=100)
+                for ingredient in (ingredients[i % 5],
+                                   ingredients[(i + 1) % 5])
+            )
+        cls.recipe = recipe
+
+    def assert_list_queries(self, num):
+        for limit in (2, RECIPES_COUNT):
+            with self.subTest(limit=limit):
+                # Каждая проверка считает запросы при пустом кэше страниц.
+                cache.clear()
+                with self.assertNumQueries(num):
+                    response = self.client.get(
+                        '/api/recipes/', {'limit': limit}
+                    )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_list_anonymous(self):
+        # COUNT, рецепты с авторами, теги, ингредиенты.
+        self.assert_list_queries(4)
+
+    def test_list_authenticated(self):
+        # Плюс избранное, список покупок и подписки пользователя.
+        self.client.force_authenticate(self.reader)
+        self.assert_list_queries(7)
+
+    def test_list_with_user_filter(self):
+        # Страница без общего кэша: флаги считаются подзапросами EXISTS.
+        self.client.force_authenticate(self.reader)
+        for limit in (2, RECIPES_COUNT):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(5):
+                    response = self.client.get(
+                        '/api/recipes/',
+                        {'limit': limit, 'is_favorited': 0}
+                    )
+                self.assertEqual(response.status_code, 200)
+
+    def test_retrieve_anonymous(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['ingredients']), 2)
+
+    def test_retrieve_authenticated(self):
+        self.client.force_authenticate(self.reader)
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+
+
+class LoadIngredientsTest(TestCase):
+    """--upsert не создаёт дублей и не меняет ингредиенты рецептов."""
+
+    def load(self, items, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'fixture.json'
+            path.write_text(json.dumps([
+                {'model': 'recipes.ingredient', 'pk': pk,
+                 'fields': {'name': name, 'measurement_unit': unit}}
+                for pk, name, unit in items
+            ]), encoding='utf-8')
+            call_command(
+                'load_ingredients', str(path), stdout=StringIO(), **options
+            )
+
+    def test_upsert_skips_conflicts(self):
+        salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        sugar = Ingredient.objects.create(name='сахар', measurement_unit='г')
+        flour = Ingredient.objects.create(name='мука', measurement_unit='г')
+        recipe = create_recipe(create_user('author'), 'Хлеб')
+        IngredientRecipe.objects.create(
+            recipe=recipe, ingredient=flour, amount=500
+        )
+        self.load([
+            # Дубль существующей пары - конфликт.
+            (salt.pk, 'сахар', 'г'),
+            # Ингредиент уже в рецепте - конфликт.
+            (flour.pk, 'мука ржаная', 'г'),
+            # Переименование освобождает старую пару.
+            (sugar.pk, 'сахар-песок', 'г'),
+            (sugar.pk + 100, 'сахар', 'г'),
+        ], upsert=True)
+        self.assertEqual(
+            set(Ingredient.objects.values_list('pk', 'name')),
+            {(salt.pk, 'соль'), (flour.pk, 'мука'),
+             (sugar.pk, 'сахар-песок'), (sugar.pk + 100, 'сахар')}
+        )
+
+
+class TagCacheTest(FoodgramAPITestCase):
+    """Версия справочника меняется только после коммита транзакции."""
+
+    def test_etag_changes_after_commit(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Завтрак', slug='breakfast')
+            # До коммита параллельный запрос видит старые данные
+            # и должен кэшировать их под старой версией.
+            self.assertEqual(self.client.get('/api/tags/')['ETag'], etag)
+        response = self.client.get('/api/tags/')
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()), 1)
+
+
+class CounterSaveTest(FoodgramAPITestCase):
+    """Обычное сохранение не затирает счётчики, изменённые сигналами."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        self.recipes = [
+            create_recipe(self.author, f'Рецепт {i}') for i in range(3)
+        ]
+
+    def test_user_update_keeps_recipes_count(self):
+        # Экземпляр загружен до создания рецептов, как из кэша токенов.
+        stale_author = User.objects.get(pk=self.author.pk)
+        create_recipe(self.author, 'Ещё рецепт')
+        self.client.force_authenticate(stale_author)
+        response = self.client.patch(
+            '/api/users/me/', {'first_name': 'Артур'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.first_name, 'Артур')
+        self.assertEqual(self.author.recipes_count, 4)
+
+    def test_recipe_update_keeps_favorites_count(self):
+        recipe = Recipe.objects.get(pk=self.recipes[0].pk)
+        FavoriteRecipeUser.objects.create(user=self.author, recipe=recipe)
+        recipe.name = 'Новое название'
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+
+
+class RecipeImageUploadTest(FoodgramAPITestCase):
+    """Загрузка изображения рецепта строкой base64."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.tag = Tag.objects.create(name='Обед', slug='lunch')
+        cls.ingredient = Ingredient.objects.create(name='Соль')
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_authenticate(self.author)
+
+    def test_line_wrapped_base64(self):
+        buffer = BytesIO()
+        Image.new('RGB', (300, 300), 'red').save(buffer, 'PNG')
+        image = base64.encodebytes(buffer.getvalue()).decode()
+        self.assertIn('\n', image)
+        response = self.client.post('/api/recipes/', {
+            'name': 'Суп', 'text': 'Описание', 'cooking_time': 30,
+            'image': f'data:image/png;base64,{image}',
+            'tags': [self.tag.id],
+            'ingredients': [{'id': self.ingredient.id, 'amount': 5}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+
+class RecipeSearchPaginationTest(FoodgramAPITestCase):
+    """Поиск с ?cursor= сохраняет порядок по релевантности."""
+
+    def test_search_ignores_cursor(self):
+        author = create_user('author')
+        # Совпадение в названии выше, хотя рецепт старше.
+        # В SQLite icontains не различает регистр только у латиницы.
+        in_name = create_recipe(author, 'борщ', text='Свёкла')
+        in_text = create_recipe(author, 'Суп', text='Почти борщ')
+        response = self.client.get(
+            '/api/recipes/', {'search': 'борщ', 'cursor': ''}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [in_name.id, in_text.id]
+        )
+
+
+class BulkDeleteTest(FoodgramAPITestCase):
+    """Пакетное удаление - фиксированное число запросов на весь пакет."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.recipes = [
+            create_recipe(cls.user, f'Рецепт {i}') for i in range(9)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def test_favorites_bulk_delete(self):
+        for size in (2, 9):
+            with self.subTest(size=size):
+                recipe_ids = [recipe.id for recipe in self.recipes[:size]]
+                self.client.post(
+                    '/api/recipes/favorite/', {'recipes': recipe_ids},
+                    format='json'
+                )
+                # DELETE ... RETURNING (или SELECT ... FOR UPDATE и DELETE),
+                # пересчёт счётчиков и точки сохранения транзакции.
+                with self.assertNumQueries(
+                    4 if can_delete_returning(connection) else 5
+                ):
+                    response = self.client.delete(
+                        '/api/recipes/favorite/', {'recipes': recipe_ids},
+                        format='json'
+                    )
+                self.assertEqual(
+                    {item['status'] for item in response.data}, {'removed'}
+                )
+                self.assertFalse(FavoriteRecipeUser.objects.exists())
+                self.assertEqual(set(Recipe.objects.values_list(
+                    'favorites_count', flat=True
+                )), {0})
+
+    # Без RETURNING параллельный DELETE ждёт блокировки SELECT ... FOR
+    # UPDATE, а в одном соединении такую гонку не воспроизвести.
+    @skipUnless(can_delete_returning(connection), 'нет DELETE ... RETURNING')
+    def test_concurrent_delete(self):
+        recipe_ids = [recipe.id for recipe in self.recipes[:3]]
+        self.client.post(
+            '/api/recipes/favorite/', {'recipes': recipe_ids}, format='json'
+        )
+        competing = FavoriteRecipeUser.objects.get(
+            user=self.user, recipe=self.recipes[0]
+        )
+        deleted_ids = []
+
+        def delete_competing(execute, sql, params, many, context):
+            # Параллельный запрос удаляет связь перед пакетным DELETE.
+            if sql.startswith('DELETE') and not deleted_ids:
+                deleted_ids.append(competing.recipe_id)
+                competing.delete()
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(delete_competing):
+            response = self.client.delete(
+                '/api/recipes/favorite/', {'recipes': recipe_ids},
+                format='json'
+            )
+        self.assertEqual(deleted_ids, [self.recipes[0].id])
+        self.assertEqual(response.data, [
+            {'id': recipe_ids[0], 'status': 'absent'},
+            {'id': recipe_ids[1], 'status': 'removed'},
+            {'id': recipe_ids[2], 'status': 'removed'},
+        ])
+        self.assertFalse(FavoriteRecipeUser.objects.exists())
+        self.assertEqual(set(Recipe.objects.values_list(
+            'favorites_count', flat=True
+        )), {0})
+
+    def test_clear_shopping_cart(self):
+        ShoppingCartUser.objects.create(user=self.user, recipe=self.recipes[0])
+        response = self.client.delete('/api/recipes/shopping_cart/clear/')
+        self.assertEqual(response.data, {'removed': [self.recipes[0].id]})
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.recipes[0].in_carts_count, 0)
+
+
+class RelationToggleTest(FoodgramAPITestCase):
+    """Добавление и удаление одного рецепта в избранном и списке покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.recipe = create_recipe(cls.user)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def test_toggle(self):
+        for url_name, model in (
+            ('favorite', FavoriteRecipeUser),
+            ('shopping_cart', ShoppingCartUser),
+        ):
+            url = f'/api/recipes/{self.recipe.id}/{url_name}/'
+            with self.subTest(url_name=url_name):
+                # Рецепт, INSERT и счётчик в точке сохранения.
+                with self.assertNumQueries(5):
+                    response = self.client.post(url)
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(response.data['id'], self.recipe.id)
+                # Неудачный INSERT откатывается к точке сохранения,
+                # затем проверяется, что связь действительно есть.
+                with self.assertNumQueries(6):
+                    response = self.client.post(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(model.objects.count(), 1)
+                # Связь, DELETE и счётчик.
+                with self.assertNumQueries(3):
+                    response = self.client.delete(url)
+                self.assertEqual(response.status_code, 204)
+                # Пустой поиск связи и проверка, что рецепт есть.
+                with self.assertNumQueries(2):
+                    response = self.client.delete(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(model.objects.exists())
+
+    def test_other_integrity_errors_raised(self):
+        with self.assertRaises(IntegrityError):
+            create_relation(FavoriteRecipeUser, user=self.user, recipe=None)
+
+
+class ShoppingCartDownloadTest(FoodgramAPITestCase):
+    """Готовый файл списка покупок сбрасывается при изменении данных."""
+
+    def download(self):
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 200)
+        return response.getvalue().decode()
+
+    def test_ingredient_rename_resets_file(self):
+        user = create_user('user')
+        ingredient = Ingredient.objects.create(
+            name='Сахар', measurement_unit='г'
+        )
+        recipe = create_recipe(user)
+        IngredientRecipe.objects.create(
+            recipe=recipe, ingredient=ingredient, amount=15
+        )
+        ShoppingCartUser.objects.create(user=user, recipe=recipe)
+        self.client.force_authenticate(user)
+        self.assertIn('Сахар (г) — 15', self.download())
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.name = 'Сахар-песок'
+            ingredient.measurement_unit = 'кг'
+            ingredient.save()
+        content = self.download()
+        self.assertIn('Сахар-песок (кг) — 15', content)
+        self.assertNotIn('Сахар (г)', content)
+
+
+class IngredientSearchTest(FoodgramAPITestCase):
+    """Автодополнение ингредиентов по индексу в памяти."""
+
+    def setUp(self):
+        super().setUp()
+        for name in ('Сахарная пудра', 'ванильный сахар', 'сахар',
+                     'Соль', 'Тростниковый САХАР'):
+            Ingredient.objects.create(name=name)
+
+    def search(self, name, **params):
+        response = self.client.get(
+            '/api/ingredients/', {'name': name, **params}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def test_prefix_before_substring(self):
+        self.assertEqual(self.search('сахар'), [
+            'сахар', 'Сахарная пудра',
+            'ванильный сахар', 'Тростниковый САХАР',
+        ])
+
+    def test_case_insensitive(self):
+        self.assertEqual(self.search('СОЛ'), ['Соль'])
+        self.assertEqual(
+            self.search('сАхАрН'), ['Сахарная пудра']
+        )
+
+    def test_limit(self):
+        self.assertEqual(
+            self.search('сахар', limit=2), ['сахар', 'Сахарная пудра']
+        )
+
+    def test_rebuilt_after_ingredient_added(self):
+        self.assertEqual(self.search('мёд'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='Мёд')
+        self.assertEqual(self.search('мёд'), ['Мёд'])
+
+
+class RecipeKeysetPaginationTest(FoodgramAPITestCase):
+    """Курсорная пагинация списка рецептов (?cursor=)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        recipes = [create_recipe(author, f'Рецепт {i}') for i in range(7)]
+        # Две группы рецептов с одинаковой датой: порядок внутри группы
+        # задаёт id, и страницы должны резать группы без потерь и повторов.
+        now = timezone.now()
+        Recipe.objects.filter(
+            pk__in=[recipe.pk for recipe in recipes[:3]]
+        ).update(pub_date=now - timedelta(days=1))
+        Recipe.objects.filter(
+            pk__in=[recipe.pk for recipe in recipes[3:]]
+        ).update(pub_date=now)
+        cls.expected = [recipe.pk for recipe in reversed(recipes)]
+
+    def test_pages_with_equal_pub_date(self):
+        url, ids, pages = '/api/recipes/?cursor=&limit=2', [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+            pages += 1
+        self.assertEqual(ids, self.expected)
+        self.assertEqual(pages, 4)
+
+    def test_invalid_cursor(self):
+        for cursor in ('not-a-cursor', 'WyJ4Il0='):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    '/api/recipes/', {'cursor': cursor}
+                )
+                self.assertEqual(response.status_code, 404)
+
+
+class RecipeFeedInboxTest(FoodgramAPITestCase):
+    """Материализованная лента подписок (RECIPE_FEED_INBOX)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user('reader')
+        cls.author = create_user('author')
+        cls.other_author = create_user('other_author')
+        cls.recipes = [
+            create_recipe(author, f'Рецепт {i}')
+            for i, author in enumerate(
+                (cls.author, cls.other_author) * 3
+            )
+        ]
+        # Половина рецептов с одинаковой датой: порядок задаёт id.
+        Recipe.objects.filter(
+            pk__in=[recipe.pk for recipe in cls.recipes[:3]]
+        ).update(pub_date=timezone.now() - timedelta(days=1))
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.reader)
+
+    def subscribe(self, author, method='post'):
+        response = getattr(self.client, method)(
+            f'/api/users/{author.id}/subscribe/'
+        )
+        self.assertIn(response.status_code, (201, 204))
+
+    def feed(self):
+        """id рецептов ленты, собранные по страницам из двух рецептов."""
+        url, ids = '/api/recipes/feed/?limit=2', []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def expected_feed(self, *authors):
+        return list(Recipe.objects.filter(author__in=authors).order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True))
+
+    def inbox(self):
+        return set(FeedEntry.objects.filter(user=self.reader).values_list(
+            'recipe_id', flat=True
+        ))
+
+    @override_settings(RECIPE_FEED_INBOX=True)
+    def test_subscribe_and_publish(self):
+        self.subscribe(self.author)
+        self.assertEqual(self.inbox(), set(self.expected_feed(self.author)))
+        recipe = create_recipe(self.author, 'Новый рецепт')
+        create_recipe(self.other_author, 'Чужой рецепт')
+        self.assertIn(recipe.id, self.inbox())
+        self.assertEqual(self.feed(), self.expected_feed(self.author))
+        self.assertEqual(self.feed()[0], recipe.id)
+
+    @override_settings(RECIPE_FEED_INBOX=True)
+    def test_unsubscribe(self):
+        self.subscribe(self.author)
+        self.subscribe(self.other_author)
+        self.subscribe(self.author, method='delete')
+        self.assertEqual(
+            self.inbox(), set(self.expected_feed(self.other_author))
+        )
+        self.assertEqual(self.feed(), self.expected_feed(self.other_author))
+
+    @override_settings(RECIPE_FEED_INBOX=True)
+    def test_recipe_deleted(self):
+        self.subscribe(self.author)
+        self.recipes[0].delete()
+        self.assertNotIn(self.recipes[0].id, self.inbox())
+        self.assertEqual(self.feed(), self.expected_feed(self.author))
+
+    def test_modes_match(self):
+        # Подписки оформлены до включения ленты: её заполняет rebuild_feeds.
+        self.subscribe(self.author)
+        self.subscribe(self.other_author)
+        self.assertFalse(self.inbox())
+        join_feed = self.feed()
+        self.assertEqual(
+            join_feed, self.expected_feed(self.author, self.other_author)
+        )
+        with override_settings(RECIPE_FEED_INBOX=True):
+            rebuild_feeds()
+            self.assertEqual(self.feed(), join_feed)
+            self.subscribe(self.other_author, method='delete')
+            create_recipe(self.author, 'Новый рецепт')
+            inbox_feed = self.feed()
+        self.assertEqual(self.feed(), inbox_feed)
+        self.assertEqual(inbox_feed, self.expected_feed(self.author))
+
+
+class TokenCacheTest(FoodgramAPITestCase):
+    """Кэш токенов сбрасывается при выходе и деактивации пользователя."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user('user')
+        response = self.client.post('/api/auth/token/login/', {
+            'email': self.user.email, 'password': PASSWORD
+        })
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {response.data["auth_token"]}'
+        )
+
+    def get_me(self):
+        return self.client.get('/api/users/me/').status_code
+
+    def test_cached_authentication(self):
+        self.assertEqual(self.get_me(), 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get_me(), 200)
+        self.assertFalse(any(
+            Token._meta.db_table in query['sql'] for query in queries
+        ))
+
+    def test_logout(self):
+        self.assertEqual(self.get_me(), 200)
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_me(), 401)
+
+    def test_token_deleted(self):
+        self.assertEqual(self.get_me(), 200)
+        Token.objects.filter(user=self.user).delete()
+        self.assertEqual(self.get_me(), 401)
+
+    def test_user_deactivated(self):
+        self.assertEqual(self.get_me(), 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_me(), 401)
+
+
+class RecipePageCacheTest(FoodgramAPITestCase):
+    """
+    Общая страница списка рецептов: флаги пользователя проставляются
+    поверх кэша, изменения рецептов сбрасывают страницу.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        self.first = create_recipe(self.author, 'Первый')
+        self.second = create_recipe(self.author, 'Второй')
+        self.alice = create_user('alice')
+        self.bob = create_user('bob')
+        FavoriteRecipeUser.objects.create(user=self.alice, recipe=self.first)
+        ShoppingCartUser.objects.create(user=self.bob, recipe=self.second)
+        Follow.objects.create(user=self.bob, following=self.author)
+
+    def get_page(self, user=None):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        return {recipe['name']: recipe for recipe in response.data['results']}
+
+    def flags(self, recipe):
+        return (
+            recipe['is_favorited'],
+            recipe['is_in_shopping_cart'],
+            recipe['author']['is_subscribed'],
+        )
+
+    def test_user_flags_on_shared_page(self):
+        page = self.get_page(self.alice)
+        self.assertEqual(self.flags(page['Первый']), (True, False, False))
+        self.assertEqual(self.flags(page['Второй']), (False, False, False))
+        # Страница уже в кэше: рецепты не читаются из базы.
+        with CaptureQueriesContext(connection) as queries:
+            page = self.get_page(self.bob)
+        self.assertFalse(any(
+            Recipe._meta.db_table in query['sql'] for query in queries
+        ))
+        self.assertEqual(self.flags(page['Первый']), (False, False, True))
+        self.assertEqual(self.flags(page['Второй']), (False, True, True))
+        page = self.get_page()
+        self.assertEqual(self.flags(page['Первый']), (False, False, False))
+
+    def test_user_flags_follow_changes(self):
+        self.get_page(self.alice)
+        with self.captureOnCommitCallbacks(execute=True):
+            ShoppingCartUser.objects.create(
+                user=self.alice, recipe=self.first
+            )
+        page = self.get_page(self.alice)
+        self.assertEqual(self.flags(page['Первый']), (True, True, False))
+
+    def test_recipe_changes_reset_page(self):
+        self.get_page()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first.name = 'Переименованный'
+            self.first.save()
+        self.assertEqual(
+            set(self.get_page()), {'Переименованный', 'Второй'}
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(self.author, 'Третий')
+        self.assertEqual(
+            set(self.get_page()), {'Переименованный', 'Второй', 'Третий'}
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.second.delete()
+        self.assertEqual(
+            set(self.get_page()), {'Переименованный', 'Третий'}
+        )
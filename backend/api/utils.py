@@ -1,38 +1,225 @@
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Exists, F, OuterRef, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.response import Response
 
-from api.serializers import SubscribeRecipeSerializer
+from api.serializers import RecipeIdsSerializer, SubscribeRecipeSerializer
 from recipes.models import Recipe
+from recipes.signals import relations_bulk_created, relations_bulk_deleted
+
+
+def create_relation(model, **fields):
+    """
+    Создать связь одним INSERT. Гонку параллельных запросов решает
+    уникальное ограничение модели: для уже существующей связи
+    возвращается None. Прочие нарушения целостности пробрасываются.
+    """
+    try:
+        with transaction.atomic():
+            return model.objects.create(**fields)
+    except IntegrityError:
+        if model.objects.filter(**fields).exists():
+            return None
+        raise
+
+
+def delete_relation(model, **fields):
+    """Удалить связь без предварительной проверки; True, если она была."""
+    deleted, _ = model.objects.filter(**fields).delete()
+    return bool(deleted)
 
 
 def post_delete_relationship_user_with_object(request, pk, model, message):
     """Добавление и удаление рецепта в связующей таблице для пользователя."""
-    recipe = get_object_or_404(Recipe, id=pk)
     if request.method == 'POST':
-        if model.objects.filter(
-                recipe=recipe,
-                user=request.user
-        ).exists():
+        recipe = get_object_or_404(
+            Recipe.objects.defer('search_vector'), id=pk
+        )
+        if create_relation(model, recipe=recipe, user=request.user) is None:
             return Response(
                 {'errors': f'Рецепт с номером {pk} уже у Вас в {message}.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        model.objects.create(
-            recipe=recipe,
-            user=request.user
-        )
         text = SubscribeRecipeSerializer(recipe)
         text = text.data
         return Response(text, status=status.HTTP_201_CREATED)
-    obj_recipe = model.objects.filter(
-        recipe=recipe,
-        user=request.user
-    )
-    if obj_recipe.exists():
-        obj_recipe.delete()
+    if delete_relation(model, recipe_id=pk, user=request.user):
         return Response(status=status.HTTP_204_NO_CONTENT)
+    get_object_or_404(Recipe, id=pk)
     return Response(
         {'errors': f'Рецепта с номером {pk} нет у Вас в {message}.'},
         status=status.HTTP_400_BAD_REQUEST
     )
+
+
+def bulk_add_relations(model, user, recipe_ids):
+    """
+    Добавить рецепты одним INSERT ... ON CONFLICT DO NOTHING.
+    Возвращает исход для каждого id: added, exists или not_found.
+    """
+    linked = dict(Recipe.objects.filter(id__in=recipe_ids).annotate(
+        linked=Exists(model.objects.filter(user=user, recipe=OuterRef('pk')))
+    ).order_by().values_list('id', 'linked'))
+    new_ids = [pk for pk, is_linked in linked.items() if not is_linked]
+    if new_ids:
+        with transaction.atomic():
+            model.objects.bulk_create(
+                [model(user=user, recipe_id=pk) for pk in new_ids],
+                ignore_conflicts=True
+            )
+            relations_bulk_created.send(
+                sender=model, user_id=user.pk, recipe_ids=new_ids
+            )
+    return [
+        {
+            'id': pk,
+            'status': (
+                'not_found' if pk not in linked
+                else 'exists' if linked[pk] else 'added'
+            ),
+        }
+        for pk in recipe_ids
+    ]
+
+
+def can_delete_returning(connection):
+    """DELETE ... RETURNING есть в PostgreSQL и в SQLite с версии 3.35."""
+    if connection.vendor == 'postgresql':
+        return True
+    return (
+        connection.vendor == 'sqlite'
+        and connection.Database.sqlite_version_info >= (3, 35)
+    )
+
+
+def delete_relations_sql(model, connection, recipe_ids):
+    """DELETE связей пользователя (с рецептами recipe_ids, если заданы)."""
+    quote_name = connection.ops.quote_name
+    options = model._meta
+    sql = 'DELETE FROM {} WHERE {} = %s'.format(
+        quote_name(options.db_table),
+        quote_name(options.get_field('user').column)
+    )
+    if recipe_ids is None:
+        return sql
+    return '{} AND {} IN ({})'.format(
+        sql,
+        quote_name(options.get_field('recipe').column),
+        ', '.join(['%s'] * len(recipe_ids))
+    )
+
+
+def delete_relations_returning(model, connection, user, recipe_ids):
+    """Удалить связи одним DELETE ... RETURNING; id удалённых рецептов."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            '{} RETURNING {}'.format(
+                delete_relations_sql(model, connection, recipe_ids),
+                connection.ops.quote_name(
+                    model._meta.get_field('recipe').column
+                )
+            ),
+            [user.pk, *(recipe_ids or ())]
+        )
+        return {recipe_id for recipe_id, in cursor.fetchall()}
+
+
+def lock_and_delete_relations(model, connection, user, recipe_ids):
+    """
+    Без RETURNING: заблокировать связи SELECT ... FOR UPDATE и удалить
+    именно их. Вызывается внутри транзакции; id удалённых рецептов.
+    """
+    relations = model.objects.using(connection.alias).filter(user=user)
+    if recipe_ids is not None:
+        relations = relations.filter(recipe_id__in=recipe_ids)
+    removed = set(relations.select_for_update().values_list(
+        'recipe_id', flat=True
+    ))
+    if removed:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                delete_relations_sql(model, connection, removed),
+                [user.pk, *removed]
+            )
+    return removed
+
+
+def bulk_delete_relations(model, user, recipe_ids=None):
+    """
+    Удалить связи пользователя с рецептами (все, если recipe_ids
+    не заданы) одним DELETE, без post_delete на каждую строку: счётчики
+    и кэши обновляет один сигнал relations_bulk_deleted.
+    Удалённые id берутся из того же DELETE (или из заблокированных
+    им строк), поэтому связи, удалённые параллельным запросом,
+    в них не попадают. Возвращает множество удалённых id рецептов.
+    """
+    if recipe_ids is not None and not recipe_ids:
+        return set()
+    connection = connections[router.db_for_write(model)]
+    delete = (
+        delete_relations_returning if can_delete_returning(connection)
+        else lock_and_delete_relations
+    )
+    with transaction.atomic(using=connection.alias):
+        removed = delete(model, connection, user, recipe_ids)
+        if removed:
+            relations_bulk_deleted.send(
+                sender=model, user_id=user.pk, recipe_ids=removed
+            )
+    return removed
+
+
+def bulk_relationship_user_with_objects(request, model):
+    """Пакетное добавление и удаление рецептов в связующей таблице."""
+    serializer = RecipeIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+    if request.method == 'POST':
+        return Response(bulk_add_relations(model, request.user, recipe_ids))
+    removed = bulk_delete_relations(model, request.user, recipe_ids)
+    return Response([
+        {'id': pk, 'status': 'removed' if pk in removed else 'absent'}
+        for pk in recipe_ids
+    ])
+
+
+def get_recipes_limit(request):
+    """Значение параметра recipes_limit или None, если он не задан."""
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit and recipes_limit.isdigit():
+        return int(recipes_limit)
+    return None
+
+
+def get_recipes_preview(authors, recipes_limit=None):
+    """
+    Первые recipes_limit рецептов каждого автора одним запросом.
+    Рецепты нумеруются оконной функцией ROW_NUMBER() в разрезе автора,
+    возвращается словарь {id автора: [рецепты]}.
+    """
+    recipes = Recipe.objects.filter(
+        author__in=[author.pk for author in authors]
+    )
+    if recipes_limit is not None:
+        ranked = recipes.annotate(
+            preview_rank=Window(
+                expression=RowNumber(),
+                partition_by=F('author_id'),
+                order_by=(F('name').asc(), F('id').asc()),
+            )
+        ).values('id', 'preview_rank')
+        sql, params = ranked.query.sql_with_params()
+        recipes = Recipe.objects.filter(id__in=RawSQL(
+            f'SELECT id FROM ({sql}) AS ranked WHERE preview_rank <= %s',
+            (*params, recipes_limit)
+        ))
+    preview = {author.pk: [] for author in authors}
+    for recipe in recipes.order_by('name', 'id').only(
+            'id', 'name', 'image', 'image_renditions', 'cooking_time',
+            'author_id'
+    ):
+        preview[recipe.author_id].append(recipe)
+    return preview
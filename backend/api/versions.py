@@ -0,0 +1,38 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _key(name):
+    return f'version:{name}'
+
+
+def get_version(name):
+    """
+    Текущая версия набора данных (случайная строка, хранится в кэше).
+    Если версии нет - например, её сбросили, вытеснили из кэша или истёк
+    CACHE_VERSION_TIMEOUT, - создаётся новая, поэтому старые
+    закэшированные данные не вернутся.
+    """
+    version = cache.get(_key(name))
+    if version is None:
+        version = uuid4().hex
+        cache.add(_key(name), version, settings.CACHE_VERSION_TIMEOUT)
+        version = cache.get(_key(name), version)
+    return version
+
+
+def bump_versions(*names):
+    """Сменить версии наборов данных после их изменения."""
+    cache.delete_many([_key(name) for name in names])
+
+
+def bump_versions_on_commit(*names):
+    """
+    Сменить версии после коммита текущей транзакции (вне транзакции -
+    сразу). Если сменить версию раньше, параллельный запрос может
+    закэшировать ещё не изменённые данные под новой версией.
+    """
+    transaction.on_commit(lambda: bump_versions(*names))
@@ -1,23 +1,40 @@
+from django.conf import settings
 from django.contrib.auth.hashers import check_password, make_password
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Prefetch
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+from api import feed_cache, shopping_cart
 from api.filters import CustomRecipeFilterSet, IngredientFilter
-from api.pagination import CustomPagination
+from api.ingredient_index import VERSION_NAME as INGREDIENTS_VERSION
+from api.ingredient_index import ingredient_index
+from api.mixins import VersionedCacheMixin
+from api.pagination import CustomPagination, KeysetPagination
+from api.parsers import LimitedJSONParser, LimitedMultiPartParser
 from api.permissions import IsAdminOrOwnerOrReadOnly
+from api.renderers import (CSVShoppingCartRenderer, PDFShoppingCartRenderer,
+                           TextShoppingCartRenderer)
 from api.serializers import (IngredientSerializer, NewUserSerializer,
                              RecipePostSerializer, RecipeSerializer,
                              SetPasswordSerializer, SubscriptionsSerializer,
                              TagSerializer, UserSerializer)
-from api.utils import post_delete_relationship_user_with_object
-from recipes.models import (FavoriteRecipeUser, Ingredient, Recipe,
-                            ShoppingCartUser, Tag)
+from api.utils import (bulk_delete_relations,
+                       bulk_relationship_user_with_objects, create_relation,
+                       delete_relation, get_recipes_limit,
+                       get_recipes_preview,
+                       post_delete_relationship_user_with_object)
+from foodgram.db.router import primary
+from recipes.feed import followed_recipes
+from recipes.models import (FavoriteRecipeUser, FeedEntry, Ingredient,
+                            IngredientRecipe, Recipe, ShoppingCartUser, Tag)
 from users.models import Follow, User
 
 
@@ -26,8 +43,63 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = IsAdminOrOwnerOrReadOnly,
     serializer_class = RecipeSerializer
     pagination_class = CustomPagination
+    parser_classes = (LimitedJSONParser, LimitedMultiPartParser, FormParser)
+    keyset_ordering = ('pub_date', 'id')
     filter_backends = (DjangoFilterBackend,)
     filterset_class = CustomRecipeFilterSet
+    # Страница собирается без флагов текущего пользователя (см. list).
+    shared_page = False
+
+    def list(self, request, *args, **kwargs):
+        """
+        Страница списка рецептов одна для всех пользователей, поэтому
+        она кэшируется целиком, а флаги is_favorited, is_in_shopping_cart
+        и is_subscribed проставляются поверх из множеств id пользователя.
+        """
+        if not feed_cache.is_cacheable(request):
+            return super().list(request, *args, **kwargs)
+        cache_key = feed_cache.get_page_cache_key(request)
+        data = cache.get(cache_key)
+        if data is None:
+            self.shared_page = True
+            with primary():
+                data = super().list(request, *args, **kwargs).data
+            cache.set(cache_key, data, settings.RECIPE_FEED_CACHE_TIMEOUT)
+        return Response(feed_cache.overlay_user_flags(data, request.user))
+
+    def get_queryset(self):
+        """
+        Автор подтягивается в том же запросе, теги и ингредиенты -
+        фиксированным числом запросов на всю страницу.
+        Флаги is_favorited и is_in_shopping_cart считаются в том же
+        запросе через подзапросы EXISTS, а не отдельным запросом на рецепт.
+        Поисковый вектор нужен только в условии поиска и не загружается.
+        """
+        queryset = Recipe.objects.select_related('author').defer(
+            'search_vector'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredient_in_recipe',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            ),
+        )
+        user = self.request.user
+        if user.is_anonymous or self.shared_page:
+            return queryset
+        return queryset.annotate(
+            is_favorited=Exists(FavoriteRecipeUser.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCartUser.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['shared_page'] = self.shared_page
+        return context
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -57,61 +129,148 @@ class RecipeViewSet(viewsets.ModelViewSet):
             message='списке покупок'
         )
 
-    @action(detail=False, methods=['get'])
-    def download_shopping_cart(self, request):
-        """Эндпоинт для загрузки списка покупок."""
-        recipes_user_in_shoplist = ShoppingCartUser.objects.filter(
-            user=request.user
-        )
-        recipes = Recipe.objects.filter(
-            recipe_in_shoplist__in=recipes_user_in_shoplist
-        )
-        ingredients = Ingredient.objects.filter(
-            ingredient_in_recipe__recipe__in=recipes
-        )
-        queryset_ingredients = ingredients.annotate(
-            sum_amount_ingredients=(Sum('ingredient_in_recipe__amount'))
-        )
-        content = (
-                'Ваш сервис, Продуктовый помощник, подготовил \nсписок '
-                + 'покупок по выбранным рецептам:\n'
-                + 50 * '_'
-                + '\n\n'
-        )
-        if not queryset_ingredients:
-            content += (
-                    'К сожалению, в списке ваших покупок пусто - '
-                    + 'поскольку Вы не добавили в него ни одного рецепта.'
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(IsAuthenticated,)
+    )
+    def feed(self, request):
+        """
+        Лента подписок: рецепты авторов, на которых подписан пользователь,
+        от новых к старым, с курсорной пагинацией (?cursor=, ?limit=).
+        При RECIPE_FEED_INBOX страница берётся из материализованной ленты
+        пользователя, иначе - запросом с JOIN по подпискам. Курсоры
+        у обоих способов одинаковые.
+        """
+        if not settings.RECIPE_FEED_INBOX:
+            paginator = KeysetPagination(self.keyset_ordering)
+            page = paginator.paginate_queryset(
+                followed_recipes(self.get_queryset(), request.user),
+                request,
+                self
             )
         else:
-            for ingr in queryset_ingredients:
-                content += (
-                        f'\t•\t{ingr.name} ({ingr.measurement_unit}) — '
-                        + f'{ingr.sum_amount_ingredients}\n\n'
-                )
-        filename = 'my_shopping_cart.txt'
-        response = HttpResponse(content, content_type='text/plain')
+            paginator = KeysetPagination(('pub_date', 'recipe_id'))
+            entries = paginator.paginate_queryset(
+                FeedEntry.objects.filter(user=request.user), request, self
+            )
+            recipes = self.get_queryset().in_bulk(
+                [entry.recipe_id for entry in entries]
+            )
+            page = [
+                recipes[entry.recipe_id] for entry in entries
+                if entry.recipe_id in recipes
+            ]
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='favorite',
+        url_name='favorite-bulk',
+        permission_classes=(IsAuthenticated,)
+    )
+    def favorite_bulk(self, request):
+        """Добавление и удаление в избранном сразу нескольких рецептов."""
+        return bulk_relationship_user_with_objects(
+            request, FavoriteRecipeUser
+        )
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart',
+        url_name='shopping-cart-bulk',
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_cart_bulk(self, request):
+        """Добавление и удаление в списке покупок нескольких рецептов."""
+        return bulk_relationship_user_with_objects(request, ShoppingCartUser)
+
+    @action(
+        detail=False,
+        methods=['delete'],
+        url_path='shopping_cart/clear',
+        permission_classes=(IsAuthenticated,)
+    )
+    def clear_shopping_cart(self, request):
+        """Очистка списка покупок; в ответе - id удалённых рецептов."""
+        removed = bulk_delete_relations(ShoppingCartUser, request.user)
+        return Response({'removed': sorted(removed)})
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(
+            TextShoppingCartRenderer,
+            CSVShoppingCartRenderer,
+            JSONRenderer,
+            PDFShoppingCartRenderer,
+        ),
+    )
+    def download_shopping_cart(self, request):
+        """
+        Эндпоинт для загрузки списка покупок.
+        Формат задаётся параметром ?format= (txt, csv, json, pdf).
+        Готовый файл кэшируется до изменения списка покупок.
+        """
+        export_format = request.accepted_renderer.format
+        content_type, render = shopping_cart.EXPORT_FORMATS[export_format]
+        cache_key = shopping_cart.get_cache_key(request.user, export_format)
+        content = cache.get(cache_key)
+        if content is not None:
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            ingredients = shopping_cart.get_ingredients(request.user)
+            response = StreamingHttpResponse(
+                shopping_cart.cached_render(
+                    cache_key, render(ingredients.iterator())
+                ),
+                content_type=content_type
+            )
+        filename = f'my_shopping_cart.{export_format}'
         response['Content-Disposition'] = 'attachment; filename={0}'.format(
             filename
         )
         return response
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(VersionedCacheMixin, viewsets.ModelViewSet):
     """Вьюсет для работы с тэгами"""
+    version_name = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(VersionedCacheMixin, viewsets.ModelViewSet):
     """Вьюсет для работы с ингредиентами"""
+    version_name = INGREDIENTS_VERSION
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     filter_backends = (DjangoFilterBackend, filters.SearchFilter,)
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        """
+        Поиск по началу названия (?name=) обслуживается индексом в памяти.
+        Сначала идут совпадения по префиксу, затем по подстроке.
+        """
+        if 'name' not in request.query_params:
+            return super().list(request, *args, **kwargs)
+        return self.versioned_response(self.search_by_name, request)
+
+    def search_by_name(self, request):
+        limit = request.query_params.get('limit')
+        return Response(ingredient_index.search(
+            request.query_params['name'],
+            int(limit) if limit and limit.isdigit()
+            else settings.INGREDIENT_SEARCH_LIMIT
+        ))
+
 
 class UserViewSet(viewsets.ModelViewSet):
     """
@@ -119,6 +278,7 @@ class UserViewSet(viewsets.ModelViewSet):
     """
     queryset = User.objects.all()
     pagination_class = CustomPagination
+    keyset_ordering = ('id',)
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -132,6 +292,8 @@ class UserViewSet(viewsets.ModelViewSet):
     )
     def get_user_me(self, request):
         """Метод обрабатывающий эндпоинт me."""
+        if request.method == 'GET':
+            return Response(self.get_serializer(request.user).data)
         serializer = self.get_serializer(
             request.user,
             data=request.data,
@@ -170,17 +332,18 @@ class UserViewSet(viewsets.ModelViewSet):
         Возвращает пользователей, на которых подписан текущий пользователь.
         В выдачу добавляются рецепты.
         """
-        user = request.user
-        queryset = User.objects.filter(following__user=user)
+        queryset = User.objects.filter(following__user=request.user)
         pages = self.paginate_queryset(queryset)
         serializer = SubscriptionsSerializer(
-            data=pages,
+            pages,
             many=True,
             context={
-                'request': request
+                'request': request,
+                'recipes_preview': get_recipes_preview(
+                    pages, get_recipes_limit(request)
+                ),
             },
         )
-        serializer.is_valid()
         return self.get_paginated_response(data=serializer.data)
 
     @action(
@@ -188,19 +351,22 @@ class UserViewSet(viewsets.ModelViewSet):
         detail=True,
     )
     def subscribe(self, request, pk=None):
-        """Метод обрабатывающий эндпоинт subscribe."""
-        # получаем интересующего пользователя из url
-        interest_user = get_object_or_404(User, id=pk)
+        """
+        Метод обрабатывающий эндпоинт subscribe.
+        Подписка создаётся и удаляется без предварительной проверки:
+        повторный запрос отсекает уникальное ограничение unique_follow.
+        """
         if request.method == 'POST':
+            # получаем интересующего пользователя из url
+            interest_user = get_object_or_404(User, id=pk)
             if request.user == interest_user:
                 return Response(
                     {'errors': 'Невозможно подписаться на самого себя.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            elif Follow.objects.filter(
-                    following=interest_user,
-                    user=request.user
-            ).exists():
+            if create_relation(
+                    Follow, following=interest_user, user=request.user
+            ) is None:
                 return Response(
                     {'errors': (
                             'Вы уже подписаны на пользователя '
@@ -208,21 +374,19 @@ class UserViewSet(viewsets.ModelViewSet):
                     )},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            Follow.objects.create(following=interest_user, user=request.user)
             serializer = SubscriptionsSerializer(
                 interest_user,
                 context={
-                    'request': request
+                    'request': request,
+                    'recipes_preview': get_recipes_preview(
+                        [interest_user], get_recipes_limit(request)
+                    ),
                 },
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        subscribe = Follow.objects.filter(
-            following=interest_user,
-            user=request.user
-        )
-        if subscribe.exists():
-            subscribe.delete()
+        if delete_relation(Follow, following_id=pk, user=request.user):
             return Response(status=status.HTTP_204_NO_CONTENT)
+        interest_user = get_object_or_404(User, id=pk)
         return Response(
             {'errors': (
                     'Вы не были подписаны на пользователя '
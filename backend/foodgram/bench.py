@@ -0,0 +1,81 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from users.models import User
+
+ROLLBACK_NOTE = (
+    'Данные создаются в транзакции и откатываются; запускать на копии базы.'
+)
+
+
+def timings(function, repeat):
+    """Время каждого из repeat вызовов в миллисекундах."""
+    result = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        result.append((time.perf_counter() - started) * 1000)
+    return result
+
+
+def measure(function, repeat):
+    """Медианное время вызова в миллисекундах."""
+    return statistics.median(timings(function, repeat))
+
+
+def create_users(prefix, count, batch_size):
+    """Создать count пользователей с префиксом prefix и вернуть их id."""
+    User.objects.bulk_create(
+        (
+            User(
+                username=f'{prefix}{number}',
+                email=f'{prefix}{number}@foodgram.bench'
+            )
+            for number in range(count)
+        ),
+        batch_size=batch_size
+    )
+    # bulk_create в SQLite не возвращает id.
+    return list(User.objects.filter(
+        username__startswith=prefix
+    ).values_list('id', flat=True))
+
+
+def create_recipes(author_ids, count, batch_size):
+    """
+    Создать count рецептов: авторы публикуют их по очереди,
+    как это было бы во времени.
+    """
+    for start in range(0, count, batch_size):
+        Recipe.objects.bulk_create([
+            Recipe(
+                author_id=author_ids[number % len(author_ids)],
+                name=f'Рецепт {number}',
+                text='Описание',
+                cooking_time=10,
+                image='recipes/bench.png',
+            )
+            for number in range(start, min(start + batch_size, count))
+        ])
+
+
+class BenchCommand(BaseCommand):
+    """Замер на временных данных; description дополняется ROLLBACK_NOTE."""
+    description = ''
+
+    @property
+    def help(self):
+        return f'{self.description} {ROLLBACK_NOTE}'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз повторить каждое измерение.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=10_000,
+            help='Размер пакета bulk_create.'
+        )
@@ -0,0 +1,77 @@
+from django.db.backends.postgresql import base
+
+from foodgram.db.pool import get_pool, publish_stats
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL с проверкой постоянных соединений и необязательным пулом.
+
+    CONN_HEALTH_CHECKS: перед первым запросом в очередном HTTP-запросе
+    переиспользуемое соединение проверяется (SELECT 1), упавшее
+    закрывается и открывается заново - как в Django 4.1.
+    POOL: {'MAX_SIZE': ..., 'TIMEOUT': ..., 'STATS_INTERVAL': ...} -
+    соединения берутся из пула процесса и возвращаются в него
+    при закрытии вместо разрыва.
+    """
+    health_check_done = False
+
+    def get_pool(self):
+        options = self.settings_dict.get('POOL')
+        if not options:
+            return None
+        return get_pool(
+            self.alias,
+            options['MAX_SIZE'],
+            options['TIMEOUT'],
+            self._is_connection_usable
+        )
+
+    @staticmethod
+    def _is_connection_usable(connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except Exception:
+            return False
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool()
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection = pool.acquire(
+            lambda: super(DatabaseWrapper, self).get_new_connection(
+                conn_params
+            )
+        )
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        pool = self.get_pool()
+        if pool is None or self.connection is None:
+            super()._close()
+            return
+        pool.release(self.connection)
+        publish_stats(self.settings_dict['POOL']['STATS_INTERVAL'])
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (self.connection is not None
+                and self.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not self.health_check_done
+                and not self.in_atomic_block):
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+        super().ensure_connection()
@@ -0,0 +1,46 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from foodgram.db import router
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def _client_key(request):
+    """Ключ клиента по токену или сессии; None для анонимного."""
+    credentials = request.headers.get('Authorization') or request.COOKIES.get(
+        settings.SESSION_COOKIE_NAME
+    )
+    if not credentials:
+        return None
+    return 'db:last_write:' + hashlib.md5(credentials.encode()).hexdigest()
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Безопасные запросы читают с реплик, если клиент ничего не записывал
+    последние DB_READ_AFTER_WRITE секунд: так он сразу видит свои
+    изменения. Время записи хранится в кэше Django (для нескольких
+    процессов кэш должен быть общим).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        key = _client_key(request)
+        use_replica = request.method in SAFE_METHODS and not (
+            key and cache.get(key)
+        )
+        token = router.start_request(use_replica)
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = router.end_request(token)
+        if key and (wrote or request.method not in SAFE_METHODS):
+            cache.set(key, True, settings.DB_READ_AFTER_WRITE)
+        return response
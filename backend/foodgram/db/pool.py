@@ -0,0 +1,161 @@
+import os
+import socket
+import threading
+import time
+from collections import deque
+
+from django.core.cache import cache
+
+STATS_CACHE_KEY = 'db_pool:stats'
+
+
+class PoolTimeoutError(Exception):
+    """Свободное соединение не появилось за отведённое время."""
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """
+    Пул соединений с БД внутри процесса (общий для его потоков).
+    Если все max_size соединений заняты, запрос ждёт освобождения
+    не дольше timeout секунд. Простаивающее соединение перед выдачей
+    проверяется функцией is_usable.
+    """
+
+    def __init__(self, max_size, timeout, is_usable=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.is_usable = is_usable
+        self._idle = deque()
+        self._condition = threading.Condition()
+        self.open = 0
+        self.in_use = 0
+        self.waits = 0
+        self.timeouts = 0
+
+    def acquire(self, connect):
+        """Взять простаивающее соединение или открыть новое (connect())."""
+        connection = self._reserve()
+        if connection is not None:
+            if self.is_usable is None or self.is_usable(connection):
+                return connection
+            # Место упавшего соединения занимает новое.
+            _close_quietly(connection)
+        try:
+            return connect()
+        except Exception:
+            with self._condition:
+                self.open -= 1
+                self.in_use -= 1
+                self._condition.notify()
+            raise
+
+    def _reserve(self):
+        """
+        Занять место в пуле. Возвращает простаивающее соединение
+        или None, если место занято под новое соединение.
+        """
+        with self._condition:
+            deadline = None
+            while not self._idle and self.open >= self.max_size:
+                if deadline is None:
+                    self.waits += 1
+                    deadline = time.monotonic() + self.timeout
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    self.timeouts += 1
+                    raise PoolTimeoutError(
+                        f'Нет свободного соединения за {self.timeout} с '
+                        f'(открыто {self.open} из {self.max_size}).'
+                    )
+            self.in_use += 1
+            if self._idle:
+                return self._idle.pop()
+            self.open += 1
+            return None
+
+    def release(self, connection, discard=False):
+        """Вернуть соединение в пул или закрыть его, если оно негодно."""
+        if not discard:
+            try:
+                if not connection.closed:
+                    connection.rollback()
+            except Exception:
+                discard = True
+            discard = discard or bool(connection.closed)
+        if discard:
+            _close_quietly(connection)
+        with self._condition:
+            self.in_use -= 1
+            if discard:
+                self.open -= 1
+            else:
+                self._idle.append(connection)
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'open': self.open,
+                'in_use': self.in_use,
+                'idle': len(self._idle),
+                'max_size': self.max_size,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_published_at = 0
+
+
+def get_pool(alias, max_size, timeout, is_usable=None):
+    """Пул соединений процесса для подключения alias."""
+    pool = _pools.get(alias)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None:
+                pool = _pools[alias] = ConnectionPool(
+                    max_size, timeout, is_usable
+                )
+    return pool
+
+
+def publish_stats(interval):
+    """
+    Не чаще раза в interval секунд записать статистику пулов процесса
+    в кэш Django, откуда её читает команда db_pool_stats. Записи
+    процессов, не обновлявшиеся 3 * interval секунд, отбрасываются.
+    """
+    global _published_at
+    now = time.time()
+    if now - _published_at < interval:
+        return
+    _published_at = now
+    process = f'{socket.gethostname()}:{os.getpid()}'
+    try:
+        stats = {
+            key: value for key, value in (cache.get(STATS_CACHE_KEY) or {})
+            .items() if now - value['updated_at'] < 3 * interval
+        }
+        stats[process] = {
+            'updated_at': now,
+            'pools': {alias: pool.stats() for alias, pool in _pools.items()},
+        }
+        cache.set(STATS_CACHE_KEY, stats, 3 * interval)
+    except Exception:
+        # Статистика не должна мешать работе с БД.
+        pass
+
+
+def collect_stats():
+    """Статистика пулов всех процессов, опубликованная в кэш."""
+    return cache.get(STATS_CACHE_KEY) or {}
@@ -0,0 +1,137 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+_state = ContextVar('db_routing_state', default=None)
+# Реплики, к которым не удалось подключиться: alias -> до какого момента
+# (time.monotonic()) не пытаться снова.
+_unavailable_until = {}
+
+
+class RoutingState:
+    """Маршрутизация запросов к БД в рамках одного HTTP-запроса."""
+
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.replica = None
+        self.wrote = False
+
+
+def start_request(use_replica):
+    return _state.set(RoutingState(use_replica))
+
+
+def end_request(token):
+    """
+    Завершить запрос; возвращает True, если в нём была запись.
+    Реплика, на которой в запросе были ошибки и которая не отвечает
+    на проверочный запрос, помечается недоступной.
+    """
+    state = _state.get()
+    _state.reset(token)
+    if (state.replica in settings.DATABASE_REPLICAS
+            and connections[state.replica].errors_occurred
+            and not is_replica_usable(state.replica)):
+        mark_unavailable(state.replica)
+    return state.wrote
+
+
+@contextmanager
+def primary():
+    """
+    Читать внутри блока из основной БД. Нужен там, где прочитанное
+    попадает в общий кэш под новой версией: отставшая реплика не должна
+    вернуть туда старые данные.
+    """
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    use_replica = state.use_replica
+    state.use_replica = False
+    try:
+        yield
+    finally:
+        state.use_replica = use_replica and not state.wrote
+
+
+def is_replica_usable(alias):
+    """
+    Проверочный запрос к реплике. Подключение к отсутствующему файлу
+    SQLite создаёт пустую базу, поэтому для SQLite проверяется, что
+    в ней есть таблицы.
+    """
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('SELECT 1 FROM sqlite_master LIMIT 1')
+            else:
+                cursor.execute('SELECT 1')
+            return cursor.fetchone() is not None
+    except DatabaseError:
+        return False
+
+
+def mark_unavailable(alias):
+    """Не выбирать реплику DB_REPLICA_RETRY_INTERVAL секунд."""
+    _unavailable_until[alias] = (
+        time.monotonic() + settings.DB_REPLICA_RETRY_INTERVAL
+    )
+    try:
+        connections[alias].close()
+    except DatabaseError:
+        pass
+
+
+def pick_replica():
+    """
+    Случайная доступная реплика; если ни одна не ответила
+    на проверочный запрос, используется основная БД.
+    """
+    for alias in random.sample(
+        settings.DATABASE_REPLICAS, len(settings.DATABASE_REPLICAS)
+    ):
+        if _unavailable_until.get(alias, 0) > time.monotonic():
+            continue
+        if not is_replica_usable(alias):
+            mark_unavailable(alias)
+            continue
+        return alias
+    return DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    """
+    Чтение в безопасных (GET, HEAD, OPTIONS) запросах идёт на реплики
+    из DATABASE_REPLICAS, запись и всё остальное - в основную БД.
+    Решение о запросе принимает ReplicaRoutingMiddleware; после первой
+    записи запрос до конца читает из основной БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.use_replica:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            state.replica = pick_replica()
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.use_replica = False
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии основной БД.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплик приходит из основной БД через репликацию.
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,270 @@
+import sqlite3
+import tempfile
+import threading
+from contextlib import closing
+from pathlib import Path
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.backends.postgresql import base as postgresql_base
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from psycopg2 import OperationalError
+
+from foodgram.db import pool, router
+from foodgram.db.base import DatabaseWrapper
+from foodgram.db.middleware import ReplicaRoutingMiddleware
+
+REPLICA = 'replica_test'
+MISSING_REPLICA = 'replica_missing'
+
+
+class FakeConnection:
+    """Соединение psycopg2 в том объёме, который нужен пулу."""
+    isolation_level = None
+
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.rollbacks = 0
+
+    def cursor(self):
+        if self.broken:
+            raise OperationalError('server closed the connection')
+        return mock.MagicMock()
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    """Выдача и возврат соединений пулом процесса."""
+
+    def make_pool(self, max_size=2, timeout=5):
+        return pool.ConnectionPool(
+            max_size, timeout, DatabaseWrapper._is_connection_usable
+        )
+
+    def test_checkout_and_return(self):
+        connections = pool.ConnectionPool(2, 5)
+        first = connections.acquire(FakeConnection)
+        second = connections.acquire(FakeConnection)
+        self.assertIsNot(first, second)
+        connections.release(first)
+        # Возвращённое соединение откатывается и выдаётся повторно.
+        self.assertEqual(first.rollbacks, 1)
+        self.assertIs(connections.acquire(FakeConnection), first)
+        self.assertEqual(connections.stats(), {
+            'open': 2, 'in_use': 2, 'idle': 0, 'max_size': 2,
+            'waits': 0, 'timeouts': 0,
+        })
+
+    def test_timeout(self):
+        connections = self.make_pool(max_size=1, timeout=0.05)
+        connections.acquire(FakeConnection)
+        with self.assertRaises(pool.PoolTimeoutError):
+            connections.acquire(FakeConnection)
+        stats = connections.stats()
+        self.assertEqual((stats['waits'], stats['timeouts']), (1, 1))
+        self.assertEqual((stats['open'], stats['in_use']), (1, 1))
+
+    def test_waits_for_released_connection(self):
+        connections = self.make_pool(max_size=1)
+        connection = connections.acquire(FakeConnection)
+        threading.Timer(0.05, connections.release, [connection]).start()
+        self.assertIs(connections.acquire(FakeConnection), connection)
+        self.assertEqual(connections.stats()['timeouts'], 0)
+
+    def test_broken_idle_connection_replaced(self):
+        connections = self.make_pool()
+        broken = connections.acquire(FakeConnection)
+        connections.release(broken)
+        broken.broken = True
+        connection = connections.acquire(FakeConnection)
+        self.assertIsNot(connection, broken)
+        self.assertTrue(broken.closed)
+        self.assertEqual(connections.stats()['open'], 1)
+
+    def test_closed_connection_discarded_on_release(self):
+        connections = self.make_pool()
+        connection = connections.acquire(FakeConnection)
+        connection.close()
+        connections.release(connection)
+        self.assertEqual(connection.rollbacks, 0)
+        self.assertEqual(connections.stats()['open'], 0)
+        self.assertIsNot(connections.acquire(FakeConnection), connection)
+
+    def test_failed_connect_frees_place(self):
+        connections = self.make_pool(max_size=1, timeout=0.05)
+        with self.assertRaises(OperationalError):
+            connections.acquire(mock.Mock(side_effect=OperationalError))
+        self.assertEqual(connections.stats()['open'], 0)
+        connections.acquire(FakeConnection)
+
+
+@mock.patch.object(
+    postgresql_base.DatabaseWrapper, 'get_new_connection',
+    side_effect=lambda conn_params: FakeConnection()
+)
+class PooledDatabaseWrapperTest(SimpleTestCase):
+    """Бэкенд foodgram.db берёт соединения из пула и возвращает их туда."""
+    alias = 'pool_test'
+
+    def setUp(self):
+        self.wrapper = DatabaseWrapper({
+            'OPTIONS': {},
+            'POOL': {'MAX_SIZE': 1, 'TIMEOUT': 0.05, 'STATS_INTERVAL': 10},
+        }, self.alias)
+
+    def tearDown(self):
+        pool._pools.pop(self.alias, None)
+
+    def connect(self):
+        connection = self.wrapper.get_new_connection({})
+        self.wrapper.connection = connection
+        return connection
+
+    def test_connection_returned_to_pool(self, get_new_connection):
+        connection = self.connect()
+        self.wrapper._close()
+        self.assertFalse(connection.closed)
+        self.assertIs(self.connect(), connection)
+        self.assertEqual(get_new_connection.call_count, 1)
+
+    def test_pool_timeout(self, get_new_connection):
+        self.connect()
+        other = DatabaseWrapper(self.wrapper.settings_dict, self.alias)
+        with self.assertRaises(pool.PoolTimeoutError):
+            other.get_new_connection({})
+
+    def test_broken_connection_discarded(self, get_new_connection):
+        broken = self.connect()
+        self.wrapper._close()
+        broken.broken = True
+        connection = self.connect()
+        self.assertIsNot(connection, broken)
+        self.assertTrue(broken.closed)
+        self.assertEqual(get_new_connection.call_count, 2)
+
+    def test_without_pool(self, get_new_connection):
+        wrapper = DatabaseWrapper({'OPTIONS': {}, 'POOL': None}, 'default')
+        self.assertIsNone(wrapper.get_pool())
+        connection = wrapper.get_new_connection({})
+        wrapper.connection = connection
+        wrapper._close()
+        self.assertTrue(connection.closed)
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTest(SimpleTestCase):
+    """
+    Чтение с реплик SQLite: реплика - отдельный файл с таблицей,
+    MISSING_REPLICA - путь к несуществующему файлу.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.replica_path = Path(directory.name, 'replica.sqlite3')
+        with closing(sqlite3.connect(self.replica_path)) as replica:
+            replica.execute('CREATE TABLE recipes_recipe (id integer)')
+            replica.commit()
+        for alias, path in (
+            (REPLICA, self.replica_path),
+            (MISSING_REPLICA, Path(directory.name, 'missing.sqlite3')),
+        ):
+            connections.databases[alias] = {
+                'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(path),
+            }
+            self.addCleanup(self.remove_alias, alias)
+        self.addCleanup(router._unavailable_until.clear)
+        cache.clear()
+
+    @staticmethod
+    def remove_alias(alias):
+        connections[alias].close()
+        del connections[alias]
+        del connections.databases[alias]
+
+    def request(self, method='get', token=None, view=None):
+        """
+        Запрос через middleware: чтение, view(), снова чтение.
+        Возвращает БД для последнего чтения.
+        """
+        databases = []
+
+        def get_response(request):
+            databases.append(router.ReplicaRouter().db_for_read(None))
+            if view is not None:
+                view()
+            databases.append(router.ReplicaRouter().db_for_read(None))
+            return HttpResponse()
+
+        headers = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+        ReplicaRoutingMiddleware(get_response)(
+            getattr(RequestFactory(), method)('/api/recipes/', **headers)
+        )
+        return databases[-1]
+
+    def test_safe_methods_read_from_replica(self):
+        for method in ('get', 'head', 'options'):
+            with self.subTest(method=method):
+                self.assertEqual(self.request(method), REPLICA)
+        for method in ('post', 'patch', 'delete'):
+            with self.subTest(method=method):
+                self.assertEqual(self.request(method), DEFAULT_DB_ALIAS)
+
+    def test_read_after_write(self):
+        self.request('post', token='writer')
+        self.assertEqual(self.request(token='writer'), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.request(token='reader'), REPLICA)
+        self.assertEqual(self.request(), REPLICA)
+        # Срок DB_READ_AFTER_WRITE истёк.
+        cache.clear()
+        self.assertEqual(self.request(token='writer'), REPLICA)
+
+    def test_write_in_safe_request(self):
+        self.assertEqual(
+            self.request(
+                token='writer',
+                view=lambda: router.ReplicaRouter().db_for_write(None)
+            ),
+            DEFAULT_DB_ALIAS
+        )
+        self.assertEqual(self.request(token='writer'), DEFAULT_DB_ALIAS)
+
+    def test_missing_replica(self):
+        with override_settings(DATABASE_REPLICAS=[MISSING_REPLICA]):
+            self.assertEqual(self.request(), DEFAULT_DB_ALIAS)
+        self.assertIn(MISSING_REPLICA, router._unavailable_until)
+        with override_settings(
+            DATABASE_REPLICAS=[MISSING_REPLICA, REPLICA]
+        ):
+            for _ in range(5):
+                self.assertEqual(self.request(), REPLICA)
+
+    def test_replica_lost_during_request(self):
+        def lose_replica():
+            connections[REPLICA].close()
+            self.replica_path.unlink()
+            with self.assertRaises(DatabaseError):
+                with connections[REPLICA].cursor() as cursor:
+                    cursor.execute('SELECT id FROM recipes_recipe')
+
+        self.assertEqual(self.request(view=lose_replica), REPLICA)
+        self.assertIn(REPLICA, router._unavailable_until)
+        self.assertEqual(self.request(), DEFAULT_DB_ALIAS)
+
+    def test_query_error_keeps_replica(self):
+        def bad_query():
+            with self.assertRaises(DatabaseError):
+                with connections[REPLICA].cursor() as cursor:
+                    cursor.execute('SELECT * FROM no_such_table')
+
+        self.request(view=bad_query)
+        self.assertNotIn(REPLICA, router._unavailable_until)
+        self.assertEqual(self.request(), REPLICA)
@@ -2,6 +2,7 @@ import os
 from datetime import timedelta
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -40,6 +41,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.db.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -70,17 +72,78 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+# Бэкенд foodgram.db - PostgreSQL с проверкой постоянных соединений
+# (DB_CONN_HEALTH_CHECKS) и необязательным пулом соединений процесса
+# (DB_POOL=True). С пулом соединение возвращается в пул в конце каждого
+# запроса, поэтому CONN_MAX_AGE не используется.
+DB_POOL = os.getenv('DB_POOL', default='False') == 'True'
+DB_ENGINE = os.getenv('DB_ENGINE', default='foodgram.db')
+# Стандартный движок PostgreSQL (его обычно пишет в .env деплой)
+# заменяется на foodgram.db, иначе проверки соединений и пул молча
+# не работали бы.
+if DB_ENGINE in ('django.db.backends.postgresql',
+                 'django.db.backends.postgresql_psycopg2'):
+    DB_ENGINE = 'foodgram.db'
+if DB_POOL and DB_ENGINE != 'foodgram.db':
+    raise ImproperlyConfigured(
+        'DB_POOL=True поддерживается только бэкендом foodgram.db, '
+        f'а DB_ENGINE={DB_ENGINE}.'
+    )
+
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv(
-            'DB_ENGINE',
-            default='django.db.backends.postgresql'
-        ),
+        'ENGINE': DB_ENGINE,
         'NAME': os.getenv('DB_NAME', default='postgres'),
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': (
+            0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', default=60))
+        ),
+        'CONN_HEALTH_CHECKS': (
+            os.getenv('DB_CONN_HEALTH_CHECKS', default='True') == 'True'
+        ),
+        'POOL': {
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', default=10)),
+            'TIMEOUT': int(os.getenv('DB_POOL_TIMEOUT', default=30)),
+            'STATS_INTERVAL': int(
+                os.getenv('DB_POOL_STATS_INTERVAL', default=10)
+            ),
+        } if DB_POOL else None,
+    }
+}
+
+# Реплики только для чтения: DB_REPLICAS - хосты PostgreSQL через запятую
+# (для SQLite - пути к копиям файла базы). Остальные параметры
+# подключения - как у основной БД.
+DATABASE_REPLICAS = []
+REPLICA_FIELD = 'NAME' if 'sqlite' in DATABASES['default']['ENGINE'] else 'HOST'
+for number, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', default='').split(',')), start=1
+):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        REPLICA_FIELD: replica.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['foodgram.db.router.ReplicaRouter']
+# Сколько секунд после записи клиент читает из основной БД.
+DB_READ_AFTER_WRITE = int(os.getenv('DB_READ_AFTER_WRITE', default=5))
+# Через сколько секунд снова пробовать недоступную реплику.
+DB_REPLICA_RETRY_INTERVAL = int(
+    os.getenv('DB_REPLICA_RETRY_INTERVAL', default=30)
+)
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
     }
 }
 
@@ -115,17 +178,85 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'backend_static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Время жизни версий наборов данных (api.versions) и закэшированных
+# по ним ответов справочников. У LocMemCache свой кэш в каждом процессе:
+# изменение из другого процесса gunicorn или из команды manage.py
+# станет видно не позже чем через этот срок. При нескольких процессах
+# нужен общий кэш (CACHE_BACKEND), тогда изменения видны сразу.
+CACHE_VERSION_TIMEOUT = int(
+    os.getenv('CACHE_VERSION_TIMEOUT', default=5 * 60)
+)
+SHOPPING_CART_CACHE_TIMEOUT = int(
+    os.getenv('SHOPPING_CART_CACHE_TIMEOUT', default=60 * 60)
+)
+# Время жизни общих страниц списка рецептов и множеств id пользователя
+# (актуальность обеспечивают версии, срок лишь ограничивает объём кэша).
+RECIPE_FEED_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_FEED_CACHE_TIMEOUT', default=10 * 60)
+)
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+INGREDIENT_SEARCH_LIMIT = int(
+    os.getenv('INGREDIENT_SEARCH_LIMIT', default=50)
+)
+
+# Ограничения на загружаемое изображение рецепта и тело запроса.
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', default=5 * 1024 * 1024)
+)
+RECIPE_IMAGE_MAX_PIXELS = int(
+    os.getenv('RECIPE_IMAGE_MAX_PIXELS', default=25_000_000)
+)
+RECIPE_REQUEST_MAX_SIZE = int(
+    os.getenv('RECIPE_REQUEST_MAX_SIZE', default=8 * 1024 * 1024)
+)
+
+# Размеры уменьшенных копий изображений рецептов (ширина, высота).
+IMAGE_RENDITIONS = {
+    'thumbnail': (160, 160),
+    'card': (480, 360),
+    'detail': (1200, 900),
+}
+IMAGE_RENDITION_QUALITY = int(
+    os.getenv('IMAGE_RENDITION_QUALITY', default=80)
+)
+# 0 - обрабатывать изображения синхронно после коммита.
+IMAGE_RENDITION_WORKERS = int(
+    os.getenv('IMAGE_RENDITION_WORKERS', default=2)
+)
+
 AUTH_USER_MODEL = 'users.User'
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6
 }
 
+# Лента подписок (/api/recipes/feed/): по умолчанию строится запросом
+# с JOIN по подпискам; RECIPE_FEED_INBOX=True включает материализованные
+# ленты, которые заполняются при публикации рецепта
+# (после включения выполнить manage.py rebuild_feeds).
+RECIPE_FEED_INBOX = os.getenv('RECIPE_FEED_INBOX', default='False') == 'True'
+RECIPE_FEED_BATCH_SIZE = int(os.getenv('RECIPE_FEED_BATCH_SIZE', default=1000))
+
+# Наибольшее число рецептов в одном пакетном запросе
+# (избранное, список покупок).
+BULK_RECIPES_LIMIT = int(os.getenv('BULK_RECIPES_LIMIT', default=100))
+
+# Кэш «токен -> пользователь» для CachedTokenAuthentication.
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', default=10000))
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', default=60))
+TOKEN_CACHE_USE_DJANGO_CACHE = (
+    os.getenv('TOKEN_CACHE_USE_DJANGO_CACHE', default='False') == 'True'
+)
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'AUTH_HEADER_TYPES': ('Bearer',),
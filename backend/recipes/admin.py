@@ -13,15 +13,18 @@ class IngredientRecipeInline(admin.TabularInline):
 
 
 class RecipeAdmin(admin.ModelAdmin):
-    readonly_fields = ('num_favorite_recipes',)
-    list_display = ('name', 'author', 'num_favorite_recipes',)
+    readonly_fields = ('num_favorite_recipes', 'in_carts_count',)
+    list_display = (
+        'name', 'author', 'num_favorite_recipes', 'in_carts_count',
+    )
     list_filter = ('author', 'name', 'tags',)
+    list_select_related = ('author',)
     search_fields = ('name__startswith',)
     inlines = [TagRecipeInline, IngredientRecipeInline, ]
 
     def num_favorite_recipes(self, obj):
         """Общее число добавлений конкретного рецепта в избранное."""
-        return FavoriteRecipeUser.objects.filter(recipe=obj).count()
+        return obj.favorites_count
 
     class Meta:
         model = Recipe
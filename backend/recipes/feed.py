@@ -0,0 +1,61 @@
+from django.conf import settings
+
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow
+
+
+def followed_recipes(queryset, user):
+    """
+    Рецепты авторов, на которых подписан пользователь: JOIN с Follow
+    по (following_id, user_id), дублей нет благодаря unique_follow.
+    """
+    return queryset.filter(author__following__user=user)
+
+
+def add_recipe_to_feeds(recipe):
+    """Разослать новый рецепт в ленты всех подписчиков автора."""
+    follower_ids = Follow.objects.filter(
+        following_id=recipe.author_id
+    ).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, recipe=recipe, pub_date=recipe.pub_date)
+            for user_id in follower_ids.iterator()
+        ),
+        batch_size=settings.RECIPE_FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def add_author_to_feed(user_id, author_id):
+    """Новая подписка: рецепты автора попадают в ленту подписчика."""
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+            for recipe_id, pub_date in Recipe.objects.filter(
+                author_id=author_id
+            ).values_list('id', 'pub_date').iterator()
+        ),
+        batch_size=settings.RECIPE_FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def remove_author_from_feed(user_id, author_id):
+    """Отписка: рецепты автора убираются из ленты подписчика."""
+    FeedEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id
+    ).delete()
+
+
+def rebuild_feeds():
+    """
+    Заново заполнить ленты по текущим подпискам.
+    Возвращает число записей в лентах.
+    """
+    FeedEntry.objects.all().delete()
+    for user_id, author_id in Follow.objects.values_list(
+        'user_id', 'following_id'
+    ).iterator():
+        add_author_to_feed(user_id, author_id)
+    return FeedEntry.objects.count()
@@ -0,0 +1,119 @@
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.dispatch import Signal
+from PIL import Image, features
+
+logger = logging.getLogger(__name__)
+
+# Копии изображения сохранены в обход save(), без post_save.
+recipe_images_ready = Signal()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Пул фоновых потоков для обработки изображений (создаётся лениво)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.IMAGE_RENDITION_WORKERS,
+                    thread_name_prefix='image-renditions',
+                )
+    return _executor
+
+
+def rendition_format():
+    """WebP, если Pillow собран с его поддержкой, иначе JPEG."""
+    if features.check('webp'):
+        return 'WEBP', 'webp'
+    return 'JPEG', 'jpg'
+
+
+def build_renditions(image_name):
+    """
+    Уменьшенные копии изображения для всех размеров из
+    settings.IMAGE_RENDITIONS. Возвращает {размер: путь в хранилище}.
+    """
+    image_format, extension = rendition_format()
+    stem = PurePosixPath(image_name).stem
+    renditions = {}
+    with default_storage.open(image_name) as file:
+        original = Image.open(file)
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'A' in original.mode
+                                    else 'RGB')
+    if image_format == 'JPEG' and original.mode == 'RGBA':
+        original = original.convert('RGB')
+    for size_name, size in settings.IMAGE_RENDITIONS.items():
+        image = original.copy()
+        image.thumbnail(size, Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(
+            buffer, image_format,
+            quality=settings.IMAGE_RENDITION_QUALITY, optimize=True
+        )
+        renditions[size_name] = default_storage.save(
+            f'renditions/{stem}_{size_name}.{extension}',
+            ContentFile(buffer.getvalue())
+        )
+    return renditions
+
+
+def process_recipe_image(recipe_id, image_name):
+    """
+    Построить копии изображения рецепта и сохранить пути к ним.
+    Если пока шла обработка картинку заменили, результат выбрасывается.
+    """
+    from recipes.models import Recipe
+
+    try:
+        renditions = build_renditions(image_name)
+        previous = Recipe.objects.filter(
+            pk=recipe_id
+        ).values_list('image_renditions', flat=True).first() or {}
+        updated = Recipe.objects.filter(
+            pk=recipe_id, image=image_name
+        ).update(image_renditions={'source': image_name, **renditions})
+        if updated:
+            recipe_images_ready.send(sender=Recipe, recipe_id=recipe_id)
+        stale = (
+            set(previous.values()) if updated else set(renditions.values())
+        ) - {image_name}
+        for path in stale:
+            default_storage.delete(path)
+    except Exception:
+        logger.exception(
+            'Не удалось обработать изображение %s рецепта %s',
+            image_name, recipe_id
+        )
+    finally:
+        close_old_connections()
+
+
+def schedule_recipe_image(recipe):
+    """
+    Поставить обработку изображения в очередь после коммита транзакции.
+    При IMAGE_RENDITION_WORKERS = 0 обработка идёт сразу (для тестов).
+    """
+    if not recipe.image or (
+            recipe.image_renditions.get('source') == recipe.image.name):
+        return
+    args = (recipe.pk, recipe.image.name)
+    if settings.IMAGE_RENDITION_WORKERS:
+        transaction.on_commit(
+            lambda: get_executor().submit(process_recipe_image, *args)
+        )
+    else:
+        transaction.on_commit(lambda: process_recipe_image(*args))
@@ -0,0 +1,116 @@
+import random
+import statistics
+
+from django.core.management.base import CommandError
+from django.db import transaction
+
+from foodgram.bench import (BenchCommand, create_recipes, create_users,
+                            timings)
+from recipes.feed import add_author_to_feed, followed_recipes
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow, User
+
+USER_PREFIX = 'bench_feed_'
+
+
+class Command(BenchCommand):
+    description = (
+        'Сравнение ленты подписок: запрос с JOIN по подпискам и '
+        'материализованная лента (RECIPE_FEED_INBOX).'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--authors', type=int, default=2000,
+            help='Сколько авторов создать.'
+        )
+        parser.add_argument(
+            '--recipes-per-author', type=int, default=50,
+            help='Сколько рецептов у каждого автора.'
+        )
+        parser.add_argument(
+            '--followers', type=int, default=10,
+            help='Сколько подписчиков, чьи ленты измеряются.'
+        )
+        parser.add_argument(
+            '--following', type=int, default=1000,
+            help='На сколько авторов подписан каждый подписчик.'
+        )
+        parser.add_argument(
+            '--page-size', type=int, default=6,
+            help='Размер страницы ленты.'
+        )
+
+    def create_data(self, options):
+        batch_size = options['batch_size']
+        author_ids = create_users(
+            f'{USER_PREFIX}author_', options['authors'], batch_size
+        )
+        follower_ids = create_users(
+            f'{USER_PREFIX}follower_', options['followers'], batch_size
+        )
+        total = len(author_ids) * options['recipes_per_author']
+        create_recipes(author_ids, total, batch_size)
+        generator = random.Random(0)
+        follows = [
+            (follower_id, author_id)
+            for follower_id in follower_ids
+            for author_id in generator.sample(
+                author_ids, min(options['following'], len(author_ids))
+            )
+        ]
+        Follow.objects.bulk_create(
+            (
+                Follow(user_id=follower_id, following_id=author_id)
+                for follower_id, author_id in follows
+            ),
+            batch_size=batch_size
+        )
+        for follower_id, author_id in follows:
+            add_author_to_feed(follower_id, author_id)
+        return follower_ids, total
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+
+        def join_page(user_id):
+            return list(followed_recipes(
+                Recipe.objects.all(), User(pk=user_id)
+            ).order_by('-pub_date', '-id').values_list(
+                'id', flat=True
+            )[:page_size])
+
+        def inbox_page(user_id):
+            return list(FeedEntry.objects.filter(
+                user_id=user_id
+            ).order_by('-pub_date', '-recipe_id').values_list(
+                'recipe_id', flat=True
+            )[:page_size])
+
+        def measure(page):
+            return statistics.median(
+                timing
+                for user_id in follower_ids
+                for timing in timings(
+                    lambda: page(user_id), options['repeat']
+                )
+            )
+
+        with transaction.atomic():
+            follower_ids, total = self.create_data(options)
+            for user_id in follower_ids:
+                if join_page(user_id) != inbox_page(user_id):
+                    raise CommandError('Ленты JOIN и inbox различаются.')
+            join, inbox = measure(join_page), measure(inbox_page)
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f'Рецептов: {total}, авторов: {options["authors"]}, '
+            f'подписчиков: {options["followers"]}, '
+            f'подписок у каждого: {options["following"]}.'
+        )
+        self.stdout.write(
+            f'Первая страница ({page_size}), медиана: '
+            f'JOIN {join:.2f} мс, inbox {inbox:.2f} мс.'
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.feed import rebuild_feeds
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполнение материализованных лент подписок по текущим подпискам. '
+        'Нужно выполнить при включении RECIPE_FEED_INBOX.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = rebuild_feeds()
+        self.stdout.write(f'Записей в лентах: {total}')
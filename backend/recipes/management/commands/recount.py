@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from recipes.models import FavoriteRecipeUser, Recipe, ShoppingCartUser
+from recipes.signals import actual_count
+from users.models import User
+
+# (модель со счётчиком, поле счётчика, считаемая модель, внешний ключ)
+COUNTERS = (
+    (Recipe, 'favorites_count', FavoriteRecipeUser, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCartUser, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчёт денормализованных счётчиков (избранное, список покупок, '
+        'число рецептов автора). Обновляются только разошедшиеся строки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать число разошедшихся строк.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            for model, counter, counted_model, foreign_key in COUNTERS:
+                actual = actual_count(counted_model, foreign_key)
+                drifted = model.objects.annotate(
+                    actual=actual
+                ).exclude(**{counter: F('actual')}).values('pk')
+                if options['dry_run']:
+                    fixed = drifted.count()
+                else:
+                    fixed = model.objects.filter(
+                        pk__in=drifted
+                    ).update(**{counter: actual})
+                self.stdout.write(
+                    f'{model._meta.label}.{counter}: '
+                    f'расхождений {fixed}'
+                )
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.18 on 2026-10-17 04:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_auto_20261017_0437'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Пути к копиям изображения разных размеров', verbose_name='Уменьшенные копии изображения'),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 
@@ -67,6 +69,8 @@ class Tag(models.Model):
 
 class Recipe(models.Model):
     """Модель рецепта"""
+    COUNTER_FIELDS = ('favorites_count', 'in_carts_count')
+
     name = models.CharField(
         max_length=200,
         verbose_name='Название блюда',
@@ -81,6 +85,13 @@ class Recipe(models.Model):
     )
 
     image = models.ImageField(verbose_name='Изображение блюда')
+    image_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии изображения',
+        help_text='Пути к копиям изображения разных размеров',
+    )
     author = models.ForeignKey(
         verbose_name='Автор рецепта',
         related_name='recipes',
@@ -100,15 +111,56 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата создания рецепта',
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлений в избранное',
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлений в список покупок',
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+        help_text='Название и описание для полнотекстового поиска',
+    )
 
     class Meta:
         verbose_name = 'Блюдо'
         verbose_name_plural = 'Блюда'
-        ordering = ('name',)
+        ordering = ('name', 'id')
+        indexes = [
+            models.Index(
+                fields=('pub_date', 'id'),
+                name='recipe_pub_date_id_idx',
+            ),
+            GinIndex(
+                fields=('search_vector',),
+                name='recipe_search_vector_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.name
 
+    def save(self, *args, **kwargs):
+        """
+        Счётчики избранного и списка покупок меняются только запросами
+        UPDATE из сигналов; обычное сохранение их не перезаписывает,
+        иначе затирались бы добавления, сделанные после загрузки рецепта.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+                and field.attname not in self.get_deferred_fields()
+            ]
+        super().save(*args, **kwargs)
+
 
 class TagRecipe(models.Model):
     """Модель тэга"""
@@ -245,3 +297,45 @@ class FavoriteRecipeUser(models.Model):
             self.user,
             self.recipe
         )
+
+
+class FeedEntry(models.Model):
+    """
+    Рецепт в ленте подписчика (материализованная лента подписок).
+    Заполняется при публикации рецепта, если включён RECIPE_FEED_INBOX.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата создания рецепта',
+        help_text='Копия Recipe.pub_date для сортировки ленты по индексу',
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_feed_entry',
+                fields=['user', 'recipe'],
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', 'pub_date', 'recipe'),
+                name='feed_entry_user_pub_date_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'Рецепт {self.recipe_id} в ленте {self.user_id}'
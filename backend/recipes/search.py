@@ -0,0 +1,57 @@
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+SEARCH_CONFIG = 'russian'
+# Поля рецепта, от которых зависит поисковый вектор.
+SEARCH_FIELDS = frozenset(('name', 'text'))
+
+
+def is_full_text_supported(using):
+    """Полнотекстовый поиск есть только в PostgreSQL."""
+    return connections[using].vendor == 'postgresql'
+
+
+def recipe_search_vector():
+    """Вектор рецепта: название весомее описания."""
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vector(queryset):
+    """Пересчитать search_vector у рецептов одним UPDATE."""
+    if is_full_text_supported(queryset.db):
+        queryset.update(search_vector=recipe_search_vector())
+
+
+def search_recipes(queryset, text):
+    """
+    Рецепты, подходящие под запрос, от более релевантных к менее.
+    В PostgreSQL - по search_vector (GIN-индекс) с ранжированием
+    ts_rank; в остальных СУБД - по вхождению всех слов запроса
+    в название или описание, совпадения в названии выше.
+    """
+    if is_full_text_supported(queryset.db):
+        query = SearchQuery(
+            text, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        ).order_by('-search_rank', '-pub_date', '-id')
+    words = text.split()
+    condition = Q()
+    for word in words:
+        condition &= Q(name__icontains=word) | Q(text__icontains=word)
+    name_matches = [
+        When(name__icontains=word, then=Value(1)) for word in words
+    ]
+    return queryset.filter(condition).annotate(
+        search_rank=sum(
+            (Case(match, default=Value(0), output_field=IntegerField())
+             for match in name_matches),
+            Value(0)
+        )
+    ).order_by('-search_rank', '-pub_date', '-id')
@@ -0,0 +1,126 @@
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from recipes.feed import (add_author_to_feed, add_recipe_to_feeds,
+                          remove_author_from_feed)
+from recipes.images import schedule_recipe_image
+from recipes.models import FavoriteRecipeUser, Recipe, ShoppingCartUser
+from recipes.search import SEARCH_FIELDS, update_search_vector
+from users.models import Follow, User
+
+COUNTERS = {
+    FavoriteRecipeUser: 'favorites_count',
+    ShoppingCartUser: 'in_carts_count',
+}
+
+
+# Связи рецептов с пользователем созданы через bulk_create, без post_save.
+relations_bulk_created = Signal()
+# Связи удалены одним DELETE, без post_delete.
+relations_bulk_deleted = Signal()
+
+
+def change_counter(queryset, field, delta):
+    """Атомарно изменить счётчик на delta, не опускаясь ниже нуля."""
+    queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def actual_count(model, foreign_key):
+    """Подзапрос с фактическим числом связанных записей."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                **{foreign_key: OuterRef('pk')}
+            ).order_by().values(foreign_key).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0
+    )
+
+
+@receiver(post_save, sender=FavoriteRecipeUser)
+@receiver(post_save, sender=ShoppingCartUser)
+def relation_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            Recipe.objects.filter(pk=instance.recipe_id),
+            COUNTERS[sender], 1
+        )
+
+
+@receiver(relations_bulk_created, sender=FavoriteRecipeUser)
+@receiver(relations_bulk_created, sender=ShoppingCartUser)
+@receiver(relations_bulk_deleted, sender=FavoriteRecipeUser)
+@receiver(relations_bulk_deleted, sender=ShoppingCartUser)
+def relations_bulk_changed(sender, recipe_ids, **kwargs):
+    """
+    Счётчики пересчитываются по фактическому числу связей одним UPDATE:
+    при ignore_conflicts и параллельных удалениях неизвестно, какие
+    строки действительно вставлены или удалены.
+    """
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        **{COUNTERS[sender]: actual_count(sender, 'recipe')}
+    )
+
+
+@receiver(post_delete, sender=FavoriteRecipeUser)
+@receiver(post_delete, sender=ShoppingCartUser)
+def relation_deleted(sender, instance, **kwargs):
+    change_counter(
+        Recipe.objects.filter(pk=instance.recipe_id),
+        COUNTERS[sender], -1
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            User.objects.filter(pk=instance.author_id), 'recipes_count', 1
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, raw, **kwargs):
+    """Новое изображение рецепта уходит на фоновую обработку."""
+    if not raw:
+        schedule_recipe_image(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_text_saved(sender, instance, using, update_fields, **kwargs):
+    """Пересчитать поисковый вектор после изменения названия или описания."""
+    if update_fields is None or SEARCH_FIELDS & set(update_fields):
+        update_search_vector(
+            Recipe.objects.using(using).filter(pk=instance.pk)
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    change_counter(
+        User.objects.filter(pk=instance.author_id), 'recipes_count', -1
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(sender, instance, created, raw, **kwargs):
+    """Новый рецепт попадает в материализованные ленты подписчиков."""
+    if created and not raw and settings.RECIPE_FEED_INBOX:
+        add_recipe_to_feeds(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw, **kwargs):
+    if created and not raw and settings.RECIPE_FEED_INBOX:
+        add_author_to_feed(instance.user_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    if settings.RECIPE_FEED_INBOX:
+        remove_author_from_feed(instance.user_id, instance.following_id)
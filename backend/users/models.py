@@ -37,6 +37,11 @@ class User(AbstractUser):
     password = models.CharField(verbose_name='Пароль', max_length=150)
     is_staff = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов',
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = [
@@ -54,6 +59,20 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        """
+        recipes_count меняется только запросами UPDATE из сигналов,
+        поэтому при обычном сохранении он не записывается: экземпляр
+        (например, из кэша токенов) может хранить устаревшее значение.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'recipes_count'
+                and field.attname not in self.get_deferred_fields()
+            ]
+        super().save(*args, **kwargs)
+
     @property
     def is_admin(self):
         return self.role == self.ADMIN